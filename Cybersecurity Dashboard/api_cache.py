@@ -0,0 +1,130 @@
+# api_cache.py - Cache des réponses des API externes (mémoire + SQLite)
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from database import get_db_connection
+
+# Nombre d'entrées conservées en mémoire (le reste est lu depuis SQLite)
+API_CACHE_SIZE = int(os.environ.get('API_CACHE_SIZE', 2048))
+
+# Durée de validité des réponses par fournisseur, puis délai pendant lequel une
+# réponse expirée peut encore être servie pendant son rafraîchissement (en secondes)
+PROVIDER_TTLS = {
+    'ipinfo': 24 * 3600,
+    'ip-api': 24 * 3600,
+    'shodan': 24 * 3600,
+}
+DEFAULT_TTL = 3600
+STALE_TTL = 7 * 24 * 3600
+
+class ApiCache:
+    """Cache à deux niveaux des réponses d'API : LRU en mémoire devant une table
+    SQLite qui survit aux redémarrages.
+
+    Une réponse expirée mais encore dans la fenêtre STALE_TTL est renvoyée
+    immédiatement, et rafraîchie en arrière-plan (stale-while-revalidate).
+    """
+    
+    def __init__(self, max_entries=API_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (fournisseur, clé) -> (valeur, date de récupération)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'stale_hits': 0, 'misses': 0}
+    
+    def get_or_fetch(self, provider, key, fetch):
+        """Renvoie la réponse en cache pour (provider, key) ou l'obtient via fetch().
+        fetch renvoie une valeur sérialisable en JSON ; ses exceptions ne sont
+        pas mises en cache"""
+        ttl = PROVIDER_TTLS.get(provider, DEFAULT_TTL)
+        cache_key = (provider, key)
+        
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+        source = 'memory_hits'
+        if entry is None:
+            entry = self._load(provider, key)
+            source = 'disk_hits'
+            if entry is not None:
+                self._remember(cache_key, *entry)
+        
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < ttl:
+                self._count(source)
+                return value
+            if age < ttl + STALE_TTL:
+                self._count('stale_hits')
+                self._refresh_in_background(provider, key, fetch)
+                return value
+        
+        self._count('misses')
+        value = fetch()
+        self._save(provider, key, value)
+        return value
+    
+    def _refresh_in_background(self, provider, key, fetch):
+        """Lance un seul rafraîchissement à la fois par clé"""
+        with self._lock:
+            if (provider, key) in self._refreshing:
+                return
+            self._refreshing.add((provider, key))
+        
+        def refresh():
+            try:
+                self._save(provider, key, fetch())
+            except Exception:
+                # La réponse expirée reste servie jusqu'au prochain essai
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard((provider, key))
+        
+        threading.Thread(target=refresh, daemon=True).start()
+    
+    def _remember(self, cache_key, value, fetched_at):
+        with self._lock:
+            self._entries[cache_key] = (value, fetched_at)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _load(self, provider, key):
+        with closing(get_db_connection()) as conn:
+            row = conn.execute('SELECT value, fetched_at FROM api_cache WHERE provider = ? AND cache_key = ?',
+                               (provider, key)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row['value']), row['fetched_at']
+    
+    def _save(self, provider, key, value):
+        fetched_at = time.time()
+        self._remember((provider, key), value, fetched_at)
+        # Une écriture en échec est annulée et la connexion toujours fermée : une
+        # transaction laissée ouverte bloquerait tous les autres écrivains
+        with closing(get_db_connection()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO api_cache (provider, cache_key, value, fetched_at) VALUES (?, ?, ?, ?)',
+                (provider, key, json.dumps(value), fetched_at)
+            )
+    
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+    
+    def stats(self):
+        """Compteurs d'utilisation du cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_size'] = len(self._entries)
+        return stats
+
+# Instance partagée par tout le processus
+api_cache = ApiCache()
@@ -7,8 +7,13 @@ from modules.dns_resolver import dns_blueprint
 from modules.network_analyzer import network_blueprint
 from modules.reverse_ip import reverse_ip_blueprint
 from modules.osint_tools import osint_blueprint
+from modules.osint_jobs import osint_jobs_blueprint
 from modules.sms_tools import sms_blueprint
 from modules.virtual_number import virtual_number_blueprint
+from http_client import http_client
+from api_cache import api_cache
+from singleflight import inflight
+from rate_limiter import rate_limiter
 import os
 
 app = Flask(__name__)
@@ -20,6 +25,7 @@ app.register_blueprint(dns_blueprint, url_prefix='/api/dns')
 app.register_blueprint(network_blueprint, url_prefix='/api/network')
 app.register_blueprint(reverse_ip_blueprint, url_prefix='/api/reverse-ip')
 app.register_blueprint(osint_blueprint, url_prefix='/api/osint')
+app.register_blueprint(osint_jobs_blueprint, url_prefix='/api/osint/jobs')
 app.register_blueprint(sms_blueprint, url_prefix='/api/sms')
 app.register_blueprint(virtual_number_blueprint, url_prefix='/api/virtual-number')
 
@@ -28,13 +34,72 @@ app.register_blueprint(virtual_number_blueprint, url_prefix='/api/virtual-number
 def index():
     return render_template('index.html')
 
+# Latences des API externes par fournisseur, compteurs du cache de réponses,
+# des appels regroupés et des files d'attente par fournisseur
+@app.route('/api/upstream-stats')
+def upstream_stats():
+    return jsonify({
+        'http': http_client.stats(),
+        'cache': api_cache.stats(),
+        'coalescing': inflight.stats(),
+        'rate_limits': rate_limiter.stats()
+    })
+
 # Configuration et chargement des clés API depuis les variables d'environnement
 app.config['SHODAN_API_KEY'] = os.environ.get('SHODAN_API_KEY', '')
 app.config['IPINFO_API_KEY'] = os.environ.get('IPINFO_API_KEY', '')
+# Base locale de géolocalisation/ASN (CSV de plages d'IP ou index compilé), optionnelle
+app.config['GEOIP_DB_PATH'] = os.environ.get('GEOIP_DB_PATH', '')
 app.config['HIBP_API_KEY'] = os.environ.get('HIBP_API_KEY', '')
 app.config['TWILIO_ACCOUNT_SID'] = os.environ.get('TWILIO_ACCOUNT_SID', '')
 app.config['TWILIO_AUTH_TOKEN'] = os.environ.get('TWILIO_AUTH_TOKEN', '')
 
+# Plafonds du moteur de scan de ports (sockets simultanées, globales et par hôte)
+app.config['PORT_SCAN_MAX_IN_FLIGHT'] = int(os.environ.get('PORT_SCAN_MAX_IN_FLIGHT', 256))
+app.config['PORT_SCAN_MAX_PER_HOST'] = int(os.environ.get('PORT_SCAN_MAX_PER_HOST', 64))
+# Nombre maximum de couples hôte×port par requête de scan groupé
+app.config['PORT_SCAN_PROBE_BUDGET'] = int(os.environ.get('PORT_SCAN_PROBE_BUDGET', 65536))
+
+# Cadence d'envoi des sondes ICMP du ping sweep (paquets par seconde)
+app.config['ICMP_SWEEP_RATE'] = int(os.environ.get('ICMP_SWEEP_RATE', 5000))
+# Cadence maximale des requêtes ARP de la découverte réseau (paquets par seconde)
+app.config['ARP_SCAN_RATE'] = int(os.environ.get('ARP_SCAN_RATE', 1000))
+
+# Nombre de requêtes DNS simultanées des recherches groupées
+app.config['DNS_BULK_CONCURRENCY'] = int(os.environ.get('DNS_BULK_CONCURRENCY', 200))
+
+# Requêtes ipinfo.io simultanées au plus lors d'une analyse d'IP groupée
+app.config['IP_BATCH_CONCURRENCY'] = int(os.environ.get('IP_BATCH_CONCURRENCY', 16))
+
+# Durée de conservation des listes de domaines du reverse IP (en secondes)
+app.config['REVERSE_IP_TTL'] = int(os.environ.get('REVERSE_IP_TTL', 24 * 3600))
+
+# Délai accordé à chaque fournisseur OSINT interrogé en parallèle (en secondes)
+app.config['OSINT_PROVIDER_DEADLINE'] = float(os.environ.get('OSINT_PROVIDER_DEADLINE', 5))
+
+# Préchargement en arrière-plan de la page Shodan suivante (consomme des crédits
+# de requête même si la page n'est jamais lue) : désactivé par défaut
+app.config['SHODAN_PREFETCH'] = os.environ.get('SHODAN_PREFETCH', '').lower() in ('1', 'true', 'yes')
+
+# Débits des fournisseurs externes, en plus des valeurs par défaut de rate_limiter.py
+# (format "fournisseur=requêtes par seconde/rafale", ex: "shodan=1/1,github=0.5/10")
+app.config['RATE_LIMITS'] = os.environ.get('RATE_LIMITS', '')
+try:
+    rate_limiter.configure_from_string(app.config['RATE_LIMITS'])
+except ValueError as e:
+    # Une valeur mal formée n'empêche pas le démarrage : les débits par défaut s'appliquent
+    print(f"RATE_LIMITS ignoré : {e}")
+
+# Tâches OSINT groupées : éléments traités en parallèle, délai par fournisseur
+# (plus long qu'en interactif, l'attente des limites de débit en fait partie)
+app.config['OSINT_JOB_WORKERS'] = int(os.environ.get('OSINT_JOB_WORKERS', 4))
+app.config['OSINT_JOB_DEADLINE'] = float(os.environ.get('OSINT_JOB_DEADLINE', 60))
+
+# Simulation des SMS des numéros virtuels : intervalle entre deux passes (en
+# secondes) et SMS reçus par numéro et par minute
+app.config['SMS_SIMULATION_TICK'] = float(os.environ.get('SMS_SIMULATION_TICK', 30))
+app.config['SMS_SIMULATION_RATE'] = float(os.environ.get('SMS_SIMULATION_RATE', 0.2))
+
 # Initialisation de la base de données
 from database import init_db
 init_db()
@@ -69,6 +69,88 @@ def init_db():
         conn.commit()
         conn.close()
         print("Base de données initialisée avec succès.")
+    
+    # Tables ajoutées depuis : créées aussi sur les bases existantes
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Inventaire des appareils découverts (mac vide si seulement vu par ping)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS device_inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ip TEXT NOT NULL,
+        ip_int INTEGER NOT NULL,
+        mac TEXT NOT NULL DEFAULT '',
+        vendor TEXT,
+        hostname TEXT,
+        source TEXT,
+        status TEXT DEFAULT 'up',
+        first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (ip, mac)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_device_inventory_ip_int ON device_inventory (ip_int)')
+    
+    # Cache persistant des réponses des API externes
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS api_cache (
+        provider TEXT NOT NULL,
+        cache_key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (provider, cache_key)
+    )
+    ''')
+    
+    # Listes de domaines du reverse IP, conservées par IP et servies par pages
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reverse_ip_lookups (
+        ip TEXT PRIMARY KEY,
+        domains_count INTEGER NOT NULL,
+        fetched_at REAL NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reverse_ip_domains (
+        ip TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        tld TEXT NOT NULL,
+        PRIMARY KEY (ip, domain)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reverse_ip_domains_tld ON reverse_ip_domains (ip, tld, domain)')
+    
+    # Tâches OSINT groupées (listes d'emails ou de pseudos) et leurs résultats,
+    # enregistrés au fil de l'eau : les éléments 'pending' servent de point de reprise
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS osint_jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        total INTEGER NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        finished_at DATETIME
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS osint_job_items (
+        job_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        identifier TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        result TEXT,
+        completed_at DATETIME,
+        PRIMARY KEY (job_id, position)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_osint_job_items_status ON osint_job_items (job_id, status, position)')
+    
+    conn.commit()
+    conn.close()
 
 def log_activity(module, action, input_data=None, result_summary=None):
     """Enregistre une activité dans les logs"""
@@ -0,0 +1,202 @@
+# dns_cache.py - Cache DNS partagé par tous les modules
+
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+import dns.resolver
+import dns.rdatatype
+
+# Taille du cache et durées de conservation par défaut (en secondes)
+DNS_CACHE_SIZE = int(os.environ.get('DNS_CACHE_SIZE', 4096))
+DEFAULT_TTL = 300          # Résolutions système (socket), dont le TTL n'est pas exposé
+DEFAULT_NEGATIVE_TTL = 60  # Réponses négatives sans SOA exploitable
+MAX_NEGATIVE_TTL = 3600
+
+class _Pending:
+    """Requête en cours, partagée par les appelants concurrents"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class DnsCache:
+    """Cache LRU des résolutions DNS.
+
+    - les réponses positives expirent selon le TTL des enregistrements ;
+    - les réponses négatives (NXDOMAIN, NoAnswer, nom inconnu de la
+      résolution système) sont aussi mises en cache (TTL du SOA si
+      disponible, RFC 2308) ; les échecs temporaires ne le sont pas ;
+    - une même requête lancée simultanément par plusieurs threads n'est
+      envoyée qu'une fois, les autres appelants attendent son résultat.
+    """
+    
+    def __init__(self, max_entries=DNS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.resolver = dns.resolver.Resolver()
+        self._entries = OrderedDict()  # clé -> (expiration, valeur, erreur)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+    
+    def _get_or_load(self, key, loader, negative_errors):
+        """Renvoie la valeur en cache pour key, ou la charge via loader().
+        loader renvoie (valeur, ttl) ; les exceptions de negative_errors sont
+        relevées, et mises en cache si elles sont définitives (_is_negative)"""
+        with self._lock:
+            entry = self._cached(key)
+            if entry is not None:
+                value, error = entry
+                if error is not None:
+                    raise error.with_traceback(None)
+                return value
+            
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _Pending()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error.with_traceback(None)
+            return pending.value
+        
+        try:
+            value, ttl = loader()
+            pending.value = value
+            self._store(key, ttl, value, None)
+            return value
+        except negative_errors as e:
+            pending.error = e
+            if _is_negative(e):
+                self._store(key, _negative_ttl(e), None, e)
+            raise
+        except Exception as e:
+            # Erreurs transitoires (timeout, serveur injoignable) : pas de mise en cache
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.event.set()
+    
+    def _cached(self, key):
+        """Renvoie (valeur, erreur) si key est en cache et valide, sinon None.
+        À appeler avec le verrou"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value, error = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        if error is not None:
+            self._stats['negative_hits'] += 1
+        return value, error
+    
+    def _store(self, key, ttl, value, error):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value, error)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def resolve(self, name, record_type='A'):
+        """Équivalent de dns.resolver.Resolver.resolve, avec cache"""
+        def loader():
+            answers = self.resolver.resolve(name, record_type)
+            return answers, max(0, answers.expiration - time.time())
+        
+        return self._get_or_load(_dns_key(name, record_type), loader, _NEGATIVE_DNS_ERRORS)
+    
+    def get_answer(self, name, record_type):
+        """Renvoie la réponse dnspython en cache (ou relève l'erreur négative en
+        cache), None si absente. Pour les appelants qui résolvent eux-mêmes,
+        par exemple avec le résolveur asynchrone"""
+        with self._lock:
+            entry = self._cached(_dns_key(name, record_type))
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+        answers, error = entry
+        if error is not None:
+            raise error.with_traceback(None)
+        return answers
+    
+    def store_answer(self, name, record_type, answers=None, error=None):
+        """Met en cache une réponse dnspython ou une erreur négative obtenue hors du cache"""
+        key = _dns_key(name, record_type)
+        if error is not None:
+            if isinstance(error, _NEGATIVE_DNS_ERRORS):
+                self._store(key, _negative_ttl(error), None, error)
+        else:
+            self._store(key, max(0, answers.expiration - time.time()), answers, None)
+    
+    def gethostbyname(self, domain):
+        """Équivalent de socket.gethostbyname, avec cache"""
+        key = ('host', domain.lower())
+        return self._get_or_load(key, lambda: (socket.gethostbyname(domain), DEFAULT_TTL),
+                                 (socket.gaierror,))
+    
+    def gethostbyaddr(self, ip):
+        """Équivalent de socket.gethostbyaddr, avec cache"""
+        key = ('addr', ip)
+        return self._get_or_load(key, lambda: (socket.gethostbyaddr(ip), DEFAULT_TTL),
+                                 (socket.herror, socket.gaierror))
+    
+    def stats(self):
+        """Compteurs d'utilisation du cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['in_flight'] = len(self._inflight)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+_NEGATIVE_DNS_ERRORS = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)
+
+# Codes des échecs définitifs de la résolution système : nom inconnu (getaddrinfo)
+# et toute erreur de résolution inverse sauf TRY_AGAIN (h_errno 2)
+_NEGATIVE_GAI_ERRNOS = {socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)}
+_HERROR_TRY_AGAIN = 2
+
+def _is_negative(error):
+    """Indique si une erreur de résolution est définitive et peut être mise en
+    cache ; EAI_AGAIN et les autres échecs temporaires sont retentés"""
+    if isinstance(error, socket.gaierror):
+        return error.errno in _NEGATIVE_GAI_ERRNOS
+    if isinstance(error, socket.herror):
+        return error.errno != _HERROR_TRY_AGAIN
+    return True
+
+def _dns_key(name, record_type):
+    """Clé de cache d'une requête DNS"""
+    return ('dns', name.lower().rstrip('.'), dns.rdatatype.from_text(record_type))
+
+def _negative_ttl(error):
+    """Durée de cache d'une réponse négative : TTL du SOA de la zone (RFC 2308)"""
+    responses = []
+    if isinstance(error, dns.resolver.NXDOMAIN):
+        responses = list(error.responses().values())
+    elif isinstance(error, dns.resolver.NoAnswer):
+        responses = [error.response()]
+    
+    for response in responses:
+        for rrset in getattr(response, 'authority', []):
+            if rrset.rdtype == dns.rdatatype.SOA:
+                return min(rrset.ttl, rrset[0].minimum, MAX_NEGATIVE_TTL)
+    return DEFAULT_NEGATIVE_TTL
+
+# Instance partagée par tout le processus
+dns_cache = DnsCache()
@@ -0,0 +1,173 @@
+# geoip_index.py - Géolocalisation et ASN hors ligne à partir d'une base de plages d'IP
+
+import bisect
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+# Format de l'index compilé : en-tête, puis tableaux d'entiers non signés 32 bits
+# (débuts de plages triés, fins de plages, numéros d'enregistrement, positions
+# des enregistrements), puis les enregistrements JSON concaténés. Tout est
+# petit-boutiste, quelle que soit la machine
+INDEX_MAGIC = b'GEOIDX01'
+INDEX_HEADER = struct.Struct('<8sII')
+
+# Nombre maximal d'enregistrements décodés conservés par index
+RECORD_CACHE_SIZE = 65536
+
+class GeoIpIndex:
+    """Index IPv4 -> enregistrement (pays, ville, ASN...) projeté en mémoire.
+
+    Le fichier compilé est lu par mmap : les tableaux ne sont pas copiés en
+    mémoire, et une recherche est une recherche dichotomique sur les débuts
+    de plages.
+    """
+    
+    def __init__(self, index_path):
+        self._file = open(index_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, records = INDEX_HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f'Index GeoIP invalide: {index_path}')
+        
+        view = memoryview(self._map)[INDEX_HEADER.size:]
+        size = 4 * count
+        self._starts = _read_uint32(view[:size])
+        self._ends = _read_uint32(view[size:2 * size])
+        self._record_ids = _read_uint32(view[2 * size:3 * size])
+        self._offsets = _read_uint32(view[3 * size:3 * size + 4 * (records + 1)])
+        self._blob = view[3 * size + 4 * (records + 1):]
+        self.ranges = count
+        self.records = records
+        self._cache = {}  # numéro d'enregistrement -> enregistrement décodé
+    
+    def _record(self, record_id):
+        """Enregistrement décodé, conservé en cache avec l'index (les plus
+        demandés en premier, dans la limite de RECORD_CACHE_SIZE)"""
+        record = self._cache.get(record_id)
+        if record is None:
+            start, end = self._offsets[record_id], self._offsets[record_id + 1]
+            record = json.loads(bytes(self._blob[start:end]))
+            if len(self._cache) < RECORD_CACHE_SIZE:
+                self._cache[record_id] = record
+        return record
+    
+    def lookup(self, ip):
+        """Renvoie l'enregistrement de la plage contenant ip (copie), ou None"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version != 4:
+            return None
+        value = int(address)
+        
+        position = bisect.bisect_right(self._starts, value) - 1
+        if position < 0 or self._ends[position] < value:
+            return None
+        return dict(self._record(self._record_ids[position]))
+
+def _read_uint32(buffer):
+    """Tableau d'entiers 32 bits petit-boutistes : vue directe sur la projection
+    en mémoire, ou copie réordonnée sur une machine gros-boutiste"""
+    if sys.byteorder == 'little':
+        return buffer.cast('I')
+    values = array('I', bytes(buffer))
+    values.byteswap()
+    return values
+
+def _write_uint32(f, values):
+    """Écrit des entiers 32 bits non signés en petit-boutiste"""
+    values = array('I', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    values.tofile(f)
+
+def _parse_range(row):
+    """Plage (début, fin) d'une ligne CSV : colonne 'network' (CIDR) ou colonnes
+    'start_ip'/'end_ip' (notation pointée ou entier)"""
+    if row.get('network'):
+        network = ipaddress.ip_network(row.pop('network'), strict=False)
+        if network.version != 4:
+            return None
+        return int(network.network_address), int(network.broadcast_address)
+    
+    start, end = row.pop('start_ip'), row.pop('end_ip')
+    start = int(start) if start.isdigit() else ipaddress.ip_address(start)
+    end = int(end) if end.isdigit() else ipaddress.ip_address(end)
+    if not isinstance(start, int) and start.version != 4:
+        return None
+    return int(start), int(end)
+
+def build_index(csv_path, index_path):
+    """Compile un fichier CSV de plages d'IP en index binaire.
+
+    Colonnes attendues : 'network' ou 'start_ip'/'end_ip', puis les champs à
+    renvoyer (par ex. country, region, city, loc, org, asn, timezone).
+    Les enregistrements identiques sont partagés entre plages.
+    """
+    ranges = []
+    record_ids = {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            bounds = _parse_range(row)
+            if bounds is None:
+                continue
+            record = json.dumps({key: value for key, value in row.items() if value}, sort_keys=True)
+            record_id = record_ids.setdefault(record, len(record_ids))
+            ranges.append((bounds[0], bounds[1], record_id))
+    ranges.sort()
+    
+    blobs = [record.encode() for record in record_ids]
+    offsets = array('I', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    
+    # Écriture dans un fichier temporaire puis remplacement atomique
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(ranges), len(blobs)))
+        _write_uint32(f, (start for start, _, _ in ranges))
+        _write_uint32(f, (end for _, end, _ in ranges))
+        _write_uint32(f, (record_id for _, _, record_id in ranges))
+        _write_uint32(f, offsets)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temp_path, index_path)
+
+_indexes = {}  # chemin -> (date de modification, index ou erreur de chargement)
+_lock = threading.Lock()
+
+def get_geoip_index(path):
+    """Renvoie l'index GeoIP pour path (CSV ou index compilé), ou None si absent.
+
+    Un CSV est compilé en '<path>.idx' au premier usage, puis à chaque fois
+    qu'il est plus récent que son index. La date de modification de path est
+    vérifiée à chaque appel : un fichier remplacé est recompilé et rechargé.
+    Un échec de compilation ou de chargement est conservé pour cette date et
+    relevé à nouveau sans nouvelle tentative, jusqu'à la modification du fichier.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                index_path = path
+                if path.endswith('.csv'):
+                    index_path = path + '.idx'
+                    if not os.path.exists(index_path) or os.path.getmtime(index_path) < mtime:
+                        build_index(path, index_path)
+                cached = _indexes[path] = (mtime, GeoIpIndex(index_path))
+            except Exception as e:
+                cached = _indexes[path] = (mtime, e)
+    if isinstance(cached[1], Exception):
+        raise cached[1].with_traceback(None)
+    return cached[1]
@@ -0,0 +1,152 @@
+# http_client.py - Client HTTP sortant partagé par tous les modules (pools de connexions, délais, reprises)
+
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import rate_limiter, DEFAULT_QUEUE_TIMEOUT
+
+# Délais par défaut (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Reprises sur erreur de connexion, 429 et 5xx, avec attente exponentielle aléatoire
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Pools de connexions persistantes : nombre d'hôtes gardés, connexions par hôte
+POOL_HOSTS = 32
+POOL_SIZE = 32
+
+# Nombre de mesures conservées par fournisseur pour les percentiles
+LATENCY_SAMPLES = 1000
+
+USER_AGENT = 'CyberSec-Platform'
+
+class HttpClient:
+    """Session requests partagée : connexions keep-alive réutilisées par hôte,
+    délais par défaut, reprises avec attente aléatoire et compteurs de latence
+    par fournisseur.
+    """
+    
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+    
+    def get(self, provider, url, **kwargs):
+        """GET vers url, compté pour provider (ex: 'ipinfo', 'shodan')"""
+        return self.request('GET', provider, url, **kwargs)
+    
+    def request(self, method, provider, url, timeout=None, retries=None,
+                queue_timeout=DEFAULT_QUEUE_TIMEOUT, **kwargs):
+        """Envoie la requête et renvoie la réponse.
+
+        Chaque tentative attend son créneau auprès du limiteur de débit du
+        fournisseur (RateLimitTimeout au-delà de queue_timeout). Les erreurs
+        de connexion, 429 et 5xx sont retentées (retries fois au plus) ; la
+        dernière réponse est renvoyée telle quelle, et la dernière erreur de
+        connexion est levée.
+        """
+        timeout = timeout or self.timeout
+        retries = self.retries if retries is None else retries
+        
+        for attempt in range(retries + 1):
+            rate_limiter.acquire(provider, queue_timeout)
+            started = time.monotonic()
+            try:
+                response = self._session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(provider, time.monotonic() - started, failed=True, retried=attempt > 0)
+                if attempt == retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            
+            self._record(provider, time.monotonic() - started,
+                         failed=response.status_code >= 500, retried=attempt > 0)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            
+            # Quota atteint : tous les appels vers ce fournisseur sont suspendus
+            # (Retry-After, sinon attente exponentielle), pas seulement celui-ci
+            delay = _retry_after(response)
+            quota = delay is not None or response.status_code == 429
+            if quota:
+                rate_limiter.block(provider, self._backoff(attempt) if delay is None else delay)
+            
+            # Au-delà de BACKOFF_MAX, inutile d'occuper le worker : la réponse
+            # est renvoyée à l'appelant
+            if attempt == retries or (delay is not None and delay > BACKOFF_MAX):
+                return response
+            response.close()
+            if not quota:
+                time.sleep(self._backoff(attempt))
+    
+    def _backoff(self, attempt):
+        """Attente exponentielle avec gigue complète"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    
+    def _record(self, provider, elapsed, failed, retried):
+        with self._lock:
+            stats = self._stats.get(provider)
+            if stats is None:
+                stats = self._stats[provider] = {
+                    'requests': 0, 'errors': 0, 'retries': 0, 'total_time': 0.0,
+                    'max_time': 0.0, 'samples': deque(maxlen=LATENCY_SAMPLES)
+                }
+            stats['requests'] += 1
+            stats['errors'] += failed
+            stats['retries'] += retried
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['samples'].append(elapsed)
+    
+    def stats(self):
+        """Latences par fournisseur (en millisecondes) et compteurs"""
+        result = {}
+        with self._lock:
+            for provider, stats in self._stats.items():
+                samples = sorted(stats['samples'])
+                
+                def percentile(p):
+                    return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 1)
+                
+                result[provider] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'avg_ms': round(stats['total_time'] / stats['requests'] * 1000, 1),
+                    'p50_ms': percentile(0.5),
+                    'p95_ms': percentile(0.95),
+                    'p99_ms': percentile(0.99),
+                    'max_ms': round(stats['max_time'] * 1000, 1)
+                }
+        return result
+
+def _retry_after(response):
+    """Délai de l'en-tête Retry-After (secondes ou date HTTP), ou None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Instance partagée par tout le processus
+http_client = HttpClient()
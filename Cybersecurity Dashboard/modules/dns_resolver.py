@@ -1,12 +1,123 @@
 # modules/dns_resolver.py - Module de résolution DNS
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import socket
+import asyncio
+import ipaddress
 import dns.resolver
+import dns.asyncresolver
+import dns.reversename
 from database import log_activity
+from dns_cache import dns_cache
+from streaming import stream_response, iter_async, STREAM_FORMATS
 
 dns_blueprint = Blueprint('dns_resolver', __name__)
 
+VALID_RECORD_TYPES = ['A', 'AAAA', 'MX', 'NS', 'TXT', 'SOA', 'CNAME']
+
+# Requêtes groupées : nombre maximum de requêtes par appel, requêtes simultanées
+# par défaut et délai maximal par requête (en secondes)
+MAX_BULK_QUERIES = 50000
+DEFAULT_BULK_CONCURRENCY = 200
+DEFAULT_QUERY_LIFETIME = 5
+
+# Balayage PTR : taille maximale du réseau (un /16) et délai par requête par défaut
+MAX_REVERSE_SWEEP_ADDRESSES = 65536
+DEFAULT_PTR_LIFETIME = 2
+
+def _format_rdata(record_type, rdata):
+    """Met en forme un enregistrement DNS pour la réponse JSON"""
+    if record_type == 'MX':
+        return {'preference': rdata.preference, 'exchange': rdata.exchange.to_text()}
+    elif record_type == 'SOA':
+        return {
+            'mname': rdata.mname.to_text(),
+            'rname': rdata.rname.to_text(),
+            'serial': rdata.serial,
+            'refresh': rdata.refresh,
+            'retry': rdata.retry,
+            'expire': rdata.expire,
+            'minimum': rdata.minimum
+        }
+    return rdata.to_text()
+
+async def _cached_resolve(resolver, name, record_type):
+    """Résolution asynchrone qui consulte puis alimente le cache DNS partagé"""
+    answers = dns_cache.get_answer(name, record_type)
+    if answers is None:
+        try:
+            answers = await resolver.resolve(name, record_type)
+        except Exception as e:
+            dns_cache.store_answer(name, record_type, error=e)
+            raise
+        dns_cache.store_answer(name, record_type, answers)
+    return answers
+
+async def _query(resolver, domain, record_type):
+    """Exécute une requête DNS asynchrone (via le cache partagé) et renvoie un
+    enregistrement de résultat, avec l'erreur éventuelle"""
+    record = {'type': 'answer', 'domain': domain, 'record_type': record_type}
+    try:
+        answers = await _cached_resolve(resolver, domain, record_type)
+        record['results'] = [_format_rdata(record_type, rdata) for rdata in answers]
+    except dns.resolver.NXDOMAIN:
+        record['error'] = 'Domaine inexistant'
+    except dns.resolver.NoAnswer:
+        record['error'] = f'Aucun enregistrement de type {record_type} trouvé'
+    except Exception as e:
+        record['error'] = f'Erreur lors de la requête DNS: {str(e)}'
+    return record
+
+async def _reverse_query(resolver, ip):
+    """Requête PTR asynchrone pour une adresse IP (hostname None si absent)"""
+    record = {'type': 'ptr', 'ip': ip, 'hostname': None}
+    try:
+        answers = await _cached_resolve(resolver, dns.reversename.from_address(ip).to_text(), 'PTR')
+        record['hostname'] = answers[0].target.to_text().rstrip('.')
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        pass
+    except Exception as e:
+        record['error'] = f'Erreur lors de la requête DNS: {str(e)}'
+    return record
+
+async def _iter_concurrently(items, handler, concurrency):
+    """Applique la coroutine handler à chaque élément, au plus concurrency à la
+    fois, et génère les résultats dans l'ordre d'achèvement"""
+    results = asyncio.Queue()
+    pending = iter(items)
+    
+    async def worker():
+        # Les workers se partagent le même itérateur d'éléments
+        for item in pending:
+            await results.put(await handler(item))
+    
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+async def iter_bulk_queries(queries, concurrency=DEFAULT_BULK_CONCURRENCY,
+                            lifetime=DEFAULT_QUERY_LIFETIME):
+    """Exécute des requêtes (domaine, type) avec le résolveur asynchrone de
+    dnspython, au plus concurrency à la fois, et génère les résultats dans
+    l'ordre d'achèvement"""
+    resolver = dns.asyncresolver.Resolver()
+    resolver.lifetime = lifetime
+    async for record in _iter_concurrently(queries, lambda query: _query(resolver, *query), concurrency):
+        yield record
+
+async def iter_reverse_sweep(ips, concurrency=DEFAULT_BULK_CONCURRENCY, lifetime=DEFAULT_PTR_LIFETIME):
+    """Requêtes PTR concurrentes sur une liste d'adresses, avec un délai par
+    requête ; génère les résultats dans l'ordre d'achèvement"""
+    resolver = dns.asyncresolver.Resolver()
+    resolver.lifetime = lifetime
+    async for record in _iter_concurrently(ips, lambda ip: _reverse_query(resolver, ip), concurrency):
+        yield record
+
 @dns_blueprint.route('/resolve', methods=['POST'])
 def resolve_domain():
     """Résout un nom de domaine en adresse IP"""
@@ -17,7 +128,7 @@ def resolve_domain():
     
     try:
         # Résolution simple avec socket
-        ip_address = socket.gethostbyname(domain)
+        ip_address = dns_cache.gethostbyname(domain)
         
         # Log de l'activité
         log_activity('dns_resolver', 'resolve', domain, ip_address)
@@ -40,31 +151,14 @@ def dns_lookup():
     if not domain:
         return jsonify({'error': 'Domaine non spécifié'}), 400
     
-    valid_types = ['A', 'AAAA', 'MX', 'NS', 'TXT', 'SOA', 'CNAME']
-    if record_type not in valid_types:
-        return jsonify({'error': f'Type de record invalide. Valeurs acceptées: {", ".join(valid_types)}'}), 400
+    if record_type not in VALID_RECORD_TYPES:
+        return jsonify({'error': f'Type de record invalide. Valeurs acceptées: {", ".join(VALID_RECORD_TYPES)}'}), 400
     
     try:
-        # Utilisation de dnspython pour des requêtes DNS plus complètes
-        resolver = dns.resolver.Resolver()
-        answers = resolver.resolve(domain, record_type)
+        # Utilisation de dnspython (via le cache partagé) pour des requêtes DNS plus complètes
+        answers = dns_cache.resolve(domain, record_type)
         
-        results = []
-        for rdata in answers:
-            if record_type == 'MX':
-                results.append({'preference': rdata.preference, 'exchange': rdata.exchange.to_text()})
-            elif record_type == 'SOA':
-                results.append({
-                    'mname': rdata.mname.to_text(),
-                    'rname': rdata.rname.to_text(),
-                    'serial': rdata.serial,
-                    'refresh': rdata.refresh,
-                    'retry': rdata.retry,
-                    'expire': rdata.expire,
-                    'minimum': rdata.minimum
-                })
-            else:
-                results.append(rdata.to_text())
+        results = [_format_rdata(record_type, rdata) for rdata in answers]
         
         # Log de l'activité
         log_activity('dns_resolver', 'lookup', f"{domain} ({record_type})", str(results))
@@ -81,6 +175,100 @@ def dns_lookup():
     except Exception as e:
         return jsonify({'error': f'Erreur lors de la requête DNS: {str(e)}'}), 500
 
+async def _profile(domain, record_types, lifetime=DEFAULT_QUERY_LIFETIME):
+    """Lance toutes les requêtes d'un domaine en parallèle sur un même résolveur"""
+    resolver = dns.asyncresolver.Resolver()
+    resolver.lifetime = lifetime
+    return await asyncio.gather(*(_query(resolver, domain, record_type) for record_type in record_types))
+
+@dns_blueprint.route('/profile', methods=['POST'])
+def dns_profile():
+    """Profil DNS complet d'un domaine : tous les types de records interrogés en
+    parallèle et fusionnés dans un seul document"""
+    domain = request.json.get('domain')
+    record_types = request.json.get('types', VALID_RECORD_TYPES)
+    
+    if not domain or not isinstance(domain, str):
+        return jsonify({'error': 'Domaine non spécifié'}), 400
+    
+    if not isinstance(record_types, (list, tuple)) or not all(isinstance(record_type, str) for record_type in record_types):
+        return jsonify({'error': 'types doit être une liste de types de record'}), 400
+    if not record_types or any(record_type not in VALID_RECORD_TYPES for record_type in record_types):
+        return jsonify({'error': f'Type de record invalide. Valeurs acceptées: {", ".join(VALID_RECORD_TYPES)}'}), 400
+    
+    try:
+        answers = asyncio.run(_profile(domain, list(dict.fromkeys(record_types))))
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de la requête DNS: {str(e)}'}), 500
+    
+    records = {}
+    errors = {}
+    for answer in answers:
+        if 'error' in answer:
+            errors[answer['record_type']] = answer['error']
+        else:
+            records[answer['record_type']] = answer['results']
+    
+    # Toutes les requêtes en NXDOMAIN : le domaine n'existe pas
+    if not records and errors and all(error == 'Domaine inexistant' for error in errors.values()):
+        return jsonify({'error': 'Domaine inexistant'}), 404
+    
+    # Log de l'activité
+    log_activity('dns_resolver', 'profile', domain, 
+                 f"Types trouvés: {', '.join(records) or 'aucun'}")
+    
+    return jsonify({
+        'domain': domain,
+        'records': records,
+        'errors': errors
+    })
+
+@dns_blueprint.route('/bulk-lookup', methods=['POST'])
+def bulk_dns_lookup():
+    """Recherche DNS groupée : plusieurs domaines × types de records, exécutés en
+    parallèle ; chaque résultat (ou erreur) est émis dès qu'il est connu"""
+    domains = request.json.get('domains', [])
+    record_types = request.json.get('types', ['A'])
+    fmt = request.json.get('format', 'ndjson')
+    
+    if not isinstance(domains, list) or not all(isinstance(domain, str) for domain in domains):
+        return jsonify({'error': 'domains doit être une liste de noms de domaine'}), 400
+    if not domains:
+        return jsonify({'error': 'Aucun domaine spécifié'}), 400
+    
+    if not isinstance(record_types, list) or not all(isinstance(record_type, str) for record_type in record_types):
+        return jsonify({'error': 'types doit être une liste de types de record'}), 400
+    invalid = [record_type for record_type in record_types if record_type not in VALID_RECORD_TYPES]
+    if invalid or not record_types:
+        return jsonify({'error': f'Type de record invalide. Valeurs acceptées: {", ".join(VALID_RECORD_TYPES)}'}), 400
+    
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    # Requêtes sans doublons, dans l'ordre de la demande
+    domains = list(dict.fromkeys(domain.strip() for domain in domains if domain and domain.strip()))
+    queries = [(domain, record_type) for domain in domains for record_type in dict.fromkeys(record_types)]
+    if len(queries) > MAX_BULK_QUERIES:
+        return jsonify({'error': f'Trop de requêtes demandées. Limitez à {MAX_BULK_QUERIES} couples domaine×type.'}), 400
+    
+    concurrency = current_app.config.get('DNS_BULK_CONCURRENCY', DEFAULT_BULK_CONCURRENCY)
+    
+    def generate():
+        errors = 0
+        for record in iter_async(iter_bulk_queries(queries, concurrency)):
+            if 'error' in record:
+                errors += 1
+            yield record
+        
+        # Log de l'activité (une entrée pour tout le lot)
+        log_activity('dns_resolver', 'bulk_lookup', 
+                     f"{len(domains)} domaines ({', '.join(dict.fromkeys(record_types))})", 
+                     f"Requêtes: {len(queries)}, Erreurs: {errors}")
+        
+        yield {'type': 'summary', 'domains': len(domains), 'queries': len(queries), 'errors': errors}
+    
+    return stream_response(generate(), fmt)
+
 @dns_blueprint.route('/reverse', methods=['POST'])
 def reverse_dns():
     """Effectue une résolution DNS inverse (IP vers nom d'hôte)"""
@@ -90,7 +278,7 @@ def reverse_dns():
         return jsonify({'error': 'Adresse IP non spécifiée'}), 400
     
     try:
-        hostname, _, _ = socket.gethostbyaddr(ip)
+        hostname, _, _ = dns_cache.gethostbyaddr(ip)
         
         # Log de l'activité
         log_activity('dns_resolver', 'reverse', ip, hostname)
@@ -102,4 +290,57 @@ def reverse_dns():
     except socket.herror:
         return jsonify({'error': 'Impossible de résoudre l\'adresse IP en nom d\'hôte'}), 404
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la résolution DNS inverse: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erreur lors de la résolution DNS inverse: {str(e)}'}), 500
+
+@dns_blueprint.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Renvoie les compteurs du cache DNS partagé (succès, échecs, taille...)"""
+    return jsonify(dns_cache.stats())
+
+@dns_blueprint.route('/reverse-sweep', methods=['POST'])
+def reverse_sweep():
+    """Résolution inverse de tout un réseau (CIDR) par requêtes PTR concurrentes ;
+    les noms d'hôtes sont émis au fur et à mesure"""
+    cidr = request.json.get('cidr')
+    fmt = request.json.get('format', 'ndjson')
+    include_missing = request.json.get('include_missing', False)
+    
+    if not cidr:
+        return jsonify({'error': 'Réseau non spécifié'}), 400
+    
+    try:
+        network = ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return jsonify({'error': 'Format de réseau invalide. Utilisez le format CIDR (ex: 192.168.0.0/22)'}), 400
+    
+    if network.num_addresses > MAX_REVERSE_SWEEP_ADDRESSES:
+        return jsonify({'error': f'Réseau trop large. Limitez à {MAX_REVERSE_SWEEP_ADDRESSES} adresses.'}), 400
+    
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    try:
+        lifetime = min(10, max(0.1, float(request.json.get('timeout', DEFAULT_PTR_LIFETIME))))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Délai par requête invalide'}), 400
+    
+    ips = [str(ip) for ip in network.hosts()]
+    concurrency = current_app.config.get('DNS_BULK_CONCURRENCY', DEFAULT_BULK_CONCURRENCY)
+    
+    def generate():
+        found = errors = 0
+        for record in iter_async(iter_reverse_sweep(ips, concurrency, lifetime)):
+            if record['hostname']:
+                found += 1
+            elif 'error' in record:
+                errors += 1
+            # Les adresses sans PTR ne sont émises que sur demande
+            if record['hostname'] or 'error' in record or include_missing:
+                yield record
+        
+        log_activity('dns_resolver', 'reverse_sweep', cidr, 
+                     f"Adresses: {len(ips)}, Noms trouvés: {found}, Erreurs: {errors}")
+        
+        yield {'type': 'summary', 'cidr': cidr, 'addresses': len(ips), 'found': found, 'errors': errors}
+    
+    return stream_response(generate(), fmt)
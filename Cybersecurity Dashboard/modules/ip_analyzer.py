@@ -1,14 +1,39 @@
 # modules/ip_analyzer.py - Module d'analyse d'adresses IP
 
 from flask import Blueprint, request, jsonify, current_app
-import requests
 import json
-import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from database import log_activity
+from dns_cache import dns_cache
+from api_cache import api_cache
+from geoip_index import get_geoip_index
+from http_client import http_client
+from singleflight import inflight
+from streaming import stream_response, STREAM_FORMATS
 import ipaddress
 
 ip_blueprint = Blueprint('ip_analyzer', __name__)
 
+# Limites de l'analyse groupée
+MAX_BATCH_IPS = 100000
+DEFAULT_BATCH_CONCURRENCY = 16
+
+def _fetch_json(provider, url):
+    """Interroge un service externe et renvoie sa réponse JSON (exception si échec)"""
+    response = http_client.get(provider, url)
+    if response.status_code != 200:
+        raise Exception(f'Erreur du service ({response.status_code}): {response.text}')
+    return response.json()
+
+def _geoip_index():
+    """Index GeoIP local configuré, ou None s'il est absent ou illisible : une
+    base corrompue ne doit pas faire échouer l'analyse, qui passe par ipinfo.io"""
+    try:
+        return get_geoip_index(current_app.config.get('GEOIP_DB_PATH', ''))
+    except Exception:
+        return None
+
 @ip_blueprint.route('/analyze', methods=['POST'])
 def analyze_ip():
     """Analyse une adresse IP et renvoie des informations géographiques et de réseau"""
@@ -16,10 +41,16 @@ def analyze_ip():
     
     # Validation basique
     try:
-        ipaddress.ip_address(ip_address)
+        ip_address = str(ipaddress.ip_address(ip_address))
     except ValueError:
         return jsonify({'error': 'Adresse IP invalide'}), 400
     
+    # Les demandes identiques simultanées partagent une seule analyse (et ses logs)
+    (data, status), _ = inflight.do(('ipinfo', ip_address), lambda: _analyze(ip_address))
+    return jsonify(data), status
+
+def _analyze(ip_address):
+    """Analyse d'une adresse IP valide ; renvoie (réponse JSON, code HTTP)"""
     # Log de l'activité
     log_activity('ip_analyzer', 'analyze', ip_address)
     
@@ -27,15 +58,30 @@ def analyze_ip():
     try:
         is_private = ipaddress.ip_address(ip_address).is_private
         if is_private:
-            return jsonify({
+            return {
                 'ip': ip_address,
                 'is_private': True,
                 'info': 'Cette adresse IP est dans une plage privée'
-            })
+            }, 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
     
-    # Utiliser ipinfo.io pour obtenir des données géographiques
+    # Base locale de plages d'IP si configurée (aucun appel réseau)
+    geoip = _geoip_index()
+    record = geoip.lookup(ip_address) if geoip else None
+    if record is not None:
+        data = {'ip': ip_address, **record, 'source': 'local'}
+        # Nom d'hôte au mieux : un échec de résolution (herror, gaierror,
+        # délai dépassé) n'empêche pas de renvoyer l'enregistrement local
+        try:
+            data['hostname'] = dns_cache.gethostbyaddr(ip_address)[0]
+        except OSError:
+            data['hostname'] = 'Non disponible'
+        
+        log_activity('ip_analyzer', 'analyze_result', ip_address, json.dumps(data))
+        return data, 200
+    
+    # Sinon, utiliser ipinfo.io pour obtenir des données géographiques
     api_key = current_app.config.get('IPINFO_API_KEY', '')
     url = f"https://ipinfo.io/{ip_address}/json"
     
@@ -43,36 +89,138 @@ def analyze_ip():
         url += f"?token={api_key}"
         
     try:
-        response = requests.get(url)
-        data = response.json()
+        # Réponse en cache si disponible (copie, pour ne pas modifier l'entrée du cache)
+        data = dict(api_cache.get_or_fetch('ipinfo', ip_address, lambda: _fetch_json('ipinfo', url)))
         
         # Ajouter des informations supplémentaires avec socket si possible
         try:
-            hostname = socket.gethostbyaddr(ip_address)[0]
+            hostname = dns_cache.gethostbyaddr(ip_address)[0]
             data['hostname'] = hostname
-        except socket.herror:
+        except OSError:
             data['hostname'] = 'Non disponible'
             
         # Logs
         log_activity('ip_analyzer', 'analyze_result', ip_address, json.dumps(data))
         
-        return jsonify(data)
+        return data, 200
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de l\'analyse de l\'IP: {str(e)}'}), 500
+        return {'error': f'Erreur lors de l\'analyse de l\'IP: {str(e)}'}, 500
 
 @ip_blueprint.route('/whois', methods=['POST'])
 def get_whois():
     """Obtient des informations WHOIS pour une adresse IP"""
     ip_address = request.json.get('ip')
     
+    # Validation basique
+    try:
+        ip_address = str(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return jsonify({'error': 'Adresse IP invalide'}), 400
+    
     # À implémenter avec une bibliothèque Python pour WHOIS
     # Exemple minimal avec un service tiers
     try:
-        response = requests.get(f"http://ip-api.com/json/{ip_address}")
-        data = response.json()
+        data = api_cache.get_or_fetch('ip-api', ip_address,
+                                      lambda: _fetch_json('ip-api', f"http://ip-api.com/json/{ip_address}"))
         
         log_activity('ip_analyzer', 'whois', ip_address, json.dumps(data))
         
         return jsonify(data)
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la récupération des données WHOIS: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erreur lors de la récupération des données WHOIS: {str(e)}'}), 500
+
+def _ipinfo_url(ip_address, api_key):
+    url = f"https://ipinfo.io/{ip_address}/json"
+    if api_key:
+        url += f"?token={api_key}"
+    return url
+
+def _enrich(ip_address, api_key, geoip):
+    """Informations d'une adresse publique : base locale, sinon ipinfo.io (via le cache)"""
+    record = geoip.lookup(ip_address) if geoip else None
+    if record is not None:
+        return {'ip': ip_address, **record, 'source': 'local'}
+    
+    data = api_cache.get_or_fetch('ipinfo', ip_address,
+                                  lambda: _fetch_json('ipinfo', _ipinfo_url(ip_address, api_key)))
+    return dict(data)
+
+def iter_batch_analysis(addresses, api_key='', geoip=None, concurrency=DEFAULT_BATCH_CONCURRENCY):
+    """Analyse une liste d'adresses sans doublons, dans l'ordre d'entrée.
+
+    Les adresses invalides ou privées sont classées localement ; les autres
+    sont interrogées en parallèle (concurrency requêtes au plus) via le client
+    HTTP partagé, dont les connexions sont réutilisées. Une fenêtre
+    bornée de résultats en attente garde l'ordre sans tout garder en mémoire.
+    Émet un enregistrement 'result' par adresse, avec 'error' en cas d'échec.
+    """
+    def classify(ip_address):
+        try:
+            if ipaddress.ip_address(ip_address).is_private:
+                return {'ip': ip_address, 'is_private': True,
+                        'info': 'Cette adresse IP est dans une plage privée'}
+        except ValueError:
+            return {'ip': ip_address, 'error': 'Adresse IP invalide'}
+        return None
+    
+    def lookup(ip_address):
+        try:
+            return _enrich(ip_address, api_key, geoip)
+        except Exception as e:
+            return {'ip': ip_address, 'error': f'Erreur lors de l\'analyse de l\'IP: {str(e)}'}
+    
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for ip_address in addresses:
+            local = classify(ip_address)
+            pending.append(local if local is not None else executor.submit(lookup, ip_address))
+            
+            while len(pending) > 4 * concurrency or (pending and isinstance(pending[0], dict)):
+                item = pending.popleft()
+                yield {'type': 'result', **(item if isinstance(item, dict) else item.result())}
+        
+        while pending:
+            item = pending.popleft()
+            yield {'type': 'result', **(item if isinstance(item, dict) else item.result())}
+
+@ip_blueprint.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """Analyse groupée : liste d'IP (ou texte, une par ligne), dédoublonnée ;
+    les résultats sont émis dans l'ordre d'entrée, avec une erreur par IP si besoin"""
+    addresses = request.json.get('ips', [])
+    fmt = request.json.get('format', 'ndjson')
+    
+    if isinstance(addresses, str):
+        addresses = addresses.replace(',', ' ').split()
+    
+    # Adresses sans doublons, dans l'ordre de la demande
+    addresses = list(dict.fromkeys(str(ip).strip() for ip in addresses if ip and str(ip).strip()))
+    if not addresses:
+        return jsonify({'error': 'Aucune adresse IP spécifiée'}), 400
+    
+    if len(addresses) > MAX_BATCH_IPS:
+        return jsonify({'error': f'Trop d\'adresses demandées. Limitez à {MAX_BATCH_IPS} adresses uniques.'}), 400
+    
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    api_key = current_app.config.get('IPINFO_API_KEY', '')
+    geoip = _geoip_index()
+    concurrency = current_app.config.get('IP_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY)
+    
+    def generate():
+        private = errors = 0
+        for record in iter_batch_analysis(addresses, api_key, geoip, concurrency):
+            if 'error' in record:
+                errors += 1
+            elif record.get('is_private'):
+                private += 1
+            yield record
+        
+        # Log de l'activité (une entrée pour tout le lot)
+        log_activity('ip_analyzer', 'analyze_batch', f"{len(addresses)} adresses", 
+                     f"Privées: {private}, Erreurs: {errors}")
+        
+        yield {'type': 'summary', 'addresses': len(addresses), 'private': private, 'errors': errors}
+    
+    return stream_response(generate(), fmt)
\ No newline at end of file
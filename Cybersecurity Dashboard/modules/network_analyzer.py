@@ -1,45 +1,516 @@
 # modules/network_analyzer.py - Module d'analyse du réseau local
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import subprocess
 import threading
 import socket
+import selectors
+import struct
+import time
+import os
+import queue
 import ipaddress
-from scapy.all import ARP, Ether, srp
-from database import log_activity
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scapy.all import ARP, Ether, srp, sendp, AsyncSniffer, conf
+from database import get_db_connection, log_activity
+from streaming import stream_response, STREAM_FORMATS
+from dns_cache import dns_cache
 
 network_blueprint = Blueprint('network_analyzer', __name__)
 
-@network_blueprint.route('/scan-local', methods=['POST'])
-def scan_local_network():
-    """Scanne le réseau local en utilisant Scapy pour ARP discovery"""
-    subnet = request.json.get('subnet')  # Format attendu: '192.168.1.0/24'
+# Découverte ARP par tranches : taille d'une tranche, taille maximale du sous-réseau,
+# cadence d'envoi par défaut (paquets/s) et attente des réponses après le dernier envoi
+ARP_CHUNK_SIZE = 256
+MAX_ARP_ADDRESSES = 65536
+DEFAULT_ARP_RATE = 1000
+DEFAULT_ARP_TIMEOUT = 2
+
+# Taille maximale d'un ping sweep (un /16) et limite du mode ping système
+MAX_SWEEP_ADDRESSES = 65536
+MAX_SUBPROCESS_SWEEP_ADDRESSES = 255
+
+# Cadence d'envoi (paquets/s) et délai d'attente des réponses ICMP par défaut
+DEFAULT_ICMP_RATE = 5000
+DEFAULT_ICMP_TIMEOUT = 0.5
+
+# Résolution inverse des hôtes actifs : nombre de résolutions simultanées et délai par résolution
+DEFAULT_PTR_WORKERS = 32
+DEFAULT_PTR_DEADLINE = 2
+
+# Mode incrémental : adresses inconnues sondées à chaque passage en plus des
+# appareils connus ; la tranche tourne d'un passage à l'autre
+INCREMENTAL_SLICE = 64
+# Attente des réponses ARP après le dernier envoi en mode incrémental : les
+# appareils d'un même segment répondent en quelques millisecondes
+INCREMENTAL_ARP_TIMEOUT = 0.5
+
+# Position de la tranche tournante par (source, première adresse, dernière adresse)
+_slice_offsets = {}
+_slice_lock = threading.Lock()
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+def _icmp_checksum(data):
+    """Calcule la somme de contrôle Internet (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def _build_echo_request(ident, seq):
+    """Construit un paquet ICMP echo request"""
+    payload = b'cybersec-sweep'
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = _icmp_checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+def _open_icmp_socket():
+    """Ouvre une socket ICMP brute, ou à défaut une socket datagramme ICMP
+    non privilégiée (Linux, net.ipv4.ping_group_range). Renvoie (socket, brute)"""
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except PermissionError:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+
+def iter_icmp_sweep(ip_list, timeout=DEFAULT_ICMP_TIMEOUT, rate=DEFAULT_ICMP_RATE):
+    """Envoie un écho ICMP à chaque adresse IPv4 depuis une seule socket et
+    génère les adresses qui répondent, au fur et à mesure des réponses.
+
+    Les réponses sont associées aux sondes par identifiant et numéro de séquence
+    (le numéro de séquence est l'index de l'adresse dans la liste). Avec une
+    socket datagramme, le noyau impose son propre identifiant : seule la paire
+    séquence/adresse source est alors vérifiée.
+    Lève OSError si aucune socket ICMP ne peut être ouverte.
+    """
+    sock, raw = _open_icmp_socket()
+    sock.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    
+    ident = os.getpid() & 0xffff
+    pending = {}  # séquence -> adresse attendue
+    interval = 1 / rate
+    index = 0
+    next_send = time.monotonic()
+    deadline = None
+    
+    try:
+        while True:
+            now = time.monotonic()
+            
+            # Envoyer les sondes dont l'heure est venue (cadence limitée)
+            while index < len(ip_list) and next_send <= now:
+                ip = ip_list[index]
+                seq = index & 0xffff
+                try:
+                    sock.sendto(_build_echo_request(ident, seq), (ip, 0))
+                except BlockingIOError:
+                    break
+                except OSError:
+                    # Adresse injoignable (pas de route, etc.)
+                    index += 1
+                    continue
+                pending[seq] = ip
+                index += 1
+                next_send += interval
+            
+            if index >= len(ip_list) and deadline is None:
+                deadline = now + timeout
+            if deadline is not None and (now >= deadline or not pending):
+                break
+            
+            wait = deadline - now if deadline is not None else max(0, next_send - now)
+            if not selector.select(wait):
+                continue
+            
+            # Lire toutes les réponses disponibles
+            while True:
+                try:
+                    data, (source, _) = sock.recvfrom(2048)
+                except BlockingIOError:
+                    break
+                # Une socket brute reçoit aussi l'en-tête IP
+                icmp = data[(data[0] & 0x0f) * 4:] if raw else data
+                if len(icmp) < 8:
+                    continue
+                icmp_type, _, _, reply_ident, seq = struct.unpack('!BBHHH', icmp[:8])
+                if icmp_type != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                    continue
+                if pending.get(seq) == source:
+                    del pending[seq]
+                    yield source
+    finally:
+        selector.close()
+        sock.close()
+
+def _icmp_available():
+    """Indique si une socket ICMP (brute ou datagramme) peut être ouverte"""
+    try:
+        sock, _ = _open_icmp_socket()
+    except OSError:
+        return False
+    sock.close()
+    return True
+
+def _ping_subprocess(ip):
+    """Ping une adresse IP avec la commande système (mode de repli)"""
+    try:
+        # Option -c 1: envoyer 1 paquet, -W 1: timeout de 1 seconde
+        if subprocess.call(['ping', '-c', '1', '-W', '1', ip], 
+                          stdout=subprocess.DEVNULL, 
+                          stderr=subprocess.DEVNULL) == 0:
+            return True
+        return False
+    except:
+        return False
+
+def _subprocess_sweep(ip_list):
+    """Ping sweep par la commande système, un thread par adresse (mode de repli)"""
+    results = {ip: False for ip in ip_list}
+    threads = []
+    
+    def ping_worker(ip):
+        results[ip] = _ping_subprocess(ip)
+    
+    for ip in ip_list:
+        thread = threading.Thread(target=ping_worker, args=(ip,))
+        threads.append(thread)
+        thread.start()
+    
+    # Attendre la fin de tous les pings
+    for thread in threads:
+        thread.join(timeout=5)
+    
+    return [ip for ip in ip_list if results[ip]]
+
+def _lookup_hostname(ip):
+    """Résolution inverse d'une adresse, 'Unknown' en cas d'échec"""
+    try:
+        return dns_cache.gethostbyaddr(ip)[0]
+    except OSError:
+        return "Unknown"
+
+def iter_hostnames(ips, max_workers=DEFAULT_PTR_WORKERS, deadline=DEFAULT_PTR_DEADLINE):
+    """Résout les noms d'hôtes en parallèle sur un pool borné et génère des
+    couples (ip, hostname) dans l'ordre d'achèvement.
+
+    Une résolution qui dépasse son délai (compté à partir de son démarrage) est
+    abandonnée et signalée 'Unknown', sans retenir les autres.
+    """
+    if not ips:
+        return
+    started = {}
+    
+    def lookup(ip):
+        started[ip] = time.monotonic()
+        return _lookup_hostname(ip)
+    
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(ips)))
+    pending = {executor.submit(lookup, ip): ip for ip in ips}
+    try:
+        while pending:
+            # Attendre jusqu'à la prochaine échéance parmi les résolutions en cours
+            deadlines = [started[ip] + deadline for ip in pending.values() if ip in started]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else deadline
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                yield pending.pop(future), future.result()
+            
+            now = time.monotonic()
+            for future, ip in list(pending.items()):
+                if ip in started and now - started[ip] >= deadline:
+                    del pending[future]
+                    yield ip, "Unknown"
+    finally:
+        # Les résolutions abandonnées se terminent en arrière-plan
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_arp_discovery(network, rate=DEFAULT_ARP_RATE, chunk_size=ARP_CHUNK_SIZE,
+                       timeout=DEFAULT_ARP_TIMEOUT, hosts=None, expected=None):
+    """Découverte ARP d'un sous-réseau par tranches, avec émission au fil de l'eau.
+
+    Un thread envoie les requêtes tranche par tranche à la cadence demandée
+    pendant qu'un sniffer capture les réponses : envoi et réception se
+    chevauchent, et seuls les paquets d'une tranche sont construits en mémoire.
+    hosts permet de sonder une partie du réseau, dans un ordre donné ;
+    expected, des adresses attendues : une fois l'envoi terminé, la découverte
+    s'arrête dès qu'elles ont toutes répondu, sans attendre timeout.
+    Génère un dict {'ip', 'mac'} par appareil, dès sa première réponse.
+    """
+    if hosts is None:
+        hosts = network.hosts()
+    replies = queue.Queue()
+    started = threading.Event()
+    finished = threading.Event()
+    stop = threading.Event()
+    errors = []
+    waiting = set(expected or ())
+    
+    sniffer = AsyncSniffer(store=False, prn=replies.put, started_callback=started.set,
+                           lfilter=lambda packet: ARP in packet and packet[ARP].op == 2)
+    sniffer.start()
+    if not started.wait(timeout=2) or not sniffer.running:
+        # Capture impossible (droits insuffisants, interface absente...)
+        if sniffer.running:
+            sniffer.stop()
+        raise RuntimeError('Impossible de démarrer la capture des réponses ARP')
+    
+    def sender():
+        try:
+            chunk = []
+            for host in hosts:
+                chunk.append(Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=str(host)))
+                if len(chunk) >= chunk_size:
+                    sendp(chunk, inter=1 / rate, verbose=0)
+                    chunk = []
+                    if stop.is_set():
+                        return
+            if chunk:
+                sendp(chunk, inter=1 / rate, verbose=0)
+        except Exception as e:
+            # Relevée par le générateur : une découverte incomplète n'est pas un résultat
+            errors.append(e)
+        finally:
+            finished.set()
+    
+    sender_thread = threading.Thread(target=sender, daemon=True)
+    sender_thread.start()
+    
+    seen = set()
+    deadline = None
+    try:
+        while True:
+            if deadline is None and finished.is_set():
+                if errors:
+                    raise errors[0]
+                deadline = time.monotonic() + timeout
+            if deadline is not None and (time.monotonic() >= deadline or (expected and not waiting)):
+                break
+            try:
+                packet = replies.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            
+            ip = packet[ARP].psrc
+            if ip in seen or ipaddress.ip_address(ip) not in network:
+                continue
+            seen.add(ip)
+            waiting.discard(ip)
+            yield {'ip': ip, 'mac': packet[ARP].hwsrc}
+    finally:
+        stop.set()
+        if sniffer.running:
+            sniffer.stop()
+
+def _mac_vendor(mac):
+    """Fabricant associé au préfixe OUI d'une adresse MAC (base de Scapy)"""
+    try:
+        # lookup renvoie (nom court, nom complet), ou l'adresse elle-même si l'OUI est inconnu
+        vendor = conf.manufdb.lookup(mac)[0]
+    except Exception:
+        return None
+    return vendor if vendor != mac else None
+
+def _load_inventory(low, high):
+    """Renvoie {ip: appareil} pour les appareils connus entre deux adresses IPv4
+    (l'observation la plus récente l'emporte pour une même IP)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT ip, mac, vendor, hostname, status FROM device_inventory
+        WHERE ip_int BETWEEN ? AND ?
+        ORDER BY last_seen, id
+    ''', (low, high))
+    rows = cursor.fetchall()
+    conn.close()
+    return {row['ip']: dict(row) for row in rows}
+
+def _known_alive(low, high):
+    """Adresses des appareils actifs lors de la dernière découverte"""
+    return [ip for ip, device in _load_inventory(low, high).items() if device['status'] == 'up']
+
+def _incremental_hosts(addresses, source, low, high, known_only=False):
+    """Adresses à sonder en mode incrémental : les appareils actifs connus, puis
+    une tranche tournante des autres adresses (sauf si known_only). Chaque
+    passage sonde au plus INCREMENTAL_SLICE adresses inconnues ; la plage
+    entière est couverte au fil des passages. Renvoie (adresses, connues)"""
+    addresses_set = set(addresses)
+    known = [ip for ip in _known_alive(low, high) if ip in addresses_set]
+    if known_only:
+        return known, known
+    known_set = set(known)
+    unknown = [ip for ip in addresses if ip not in known_set]
+    if len(unknown) <= INCREMENTAL_SLICE:
+        return known + unknown, known
+    
+    with _slice_lock:
+        start = _slice_offsets.get((source, low, high), 0) % len(unknown)
+        _slice_offsets[(source, low, high)] = start + INCREMENTAL_SLICE
+    rotating = unknown[start:start + INCREMENTAL_SLICE]
+    rotating += unknown[:INCREMENTAL_SLICE - len(rotating)]
+    return known + rotating, known
+
+def update_inventory(devices, probed, source, low, high):
+    """Enregistre les appareils observés dans l'inventaire et renvoie le delta
+    par rapport à la découverte précédente : nouveaux, disparus et changements
+    d'association IP/MAC.
+
+    devices : dicts {'ip', 'mac' (optionnelle), 'hostname' (optionnel)}
+    probed : adresses sondées ; un appareil actif connu parmi elles qui n'a pas
+    répondu est marqué disparu. Seul l'ARP voit tous les appareils du segment :
+    une autre source (ping) ne marque disparus que les appareils connus sans
+    adresse MAC, un appareil qui filtre l'ICMP restant actif.
+    """
+    known = _load_inventory(low, high)
+    known_macs = {device['mac']: ip for ip, device in known.items()
+                  if device['mac'] and device['status'] == 'up'}
+    delta = {'new': [], 'gone': [], 'changed': []}
+    found = set()
+    moved_from = set()
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    for device in devices:
+        ip = device['ip']
+        mac = device.get('mac', '')
+        hostname = device.get('hostname')
+        if hostname == 'Unknown':
+            hostname = None
+        found.add(ip)
+        
+        previous = known.get(ip)
+        if previous is None or previous['status'] != 'up':
+            old_ip = known_macs.get(mac) if mac else None
+            if old_ip and old_ip != ip:
+                # Même appareil, nouvelle adresse IP
+                delta['changed'].append({'mac': mac, 'old_ip': old_ip, 'ip': ip})
+                cursor.execute("UPDATE device_inventory SET status = 'down' WHERE ip = ? AND mac = ?", (old_ip, mac))
+                moved_from.add(old_ip)
+            else:
+                delta['new'].append({'ip': ip, 'mac': mac or None})
+        elif mac and previous['mac'] and previous['mac'] != mac:
+            # Même adresse IP, autre appareil
+            delta['changed'].append({'ip': ip, 'old_mac': previous['mac'], 'mac': mac})
+            cursor.execute("UPDATE device_inventory SET status = 'down' WHERE ip = ? AND mac = ?", (ip, previous['mac']))
+        
+        if mac:
+            cursor.execute('SELECT 1 FROM device_inventory WHERE ip = ? AND mac = ?', (ip, mac))
+            if cursor.fetchone() is None:
+                # Un appareil vu seulement par ping reçoit l'adresse MAC découverte
+                cursor.execute("UPDATE device_inventory SET mac = ? WHERE ip = ? AND mac = ''", (mac, ip))
+            cursor.execute('''
+                INSERT INTO device_inventory (ip, ip_int, mac, vendor, hostname, source)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ip, mac) DO UPDATE SET
+                    last_seen = CURRENT_TIMESTAMP, status = 'up', source = excluded.source,
+                    vendor = COALESCE(excluded.vendor, vendor),
+                    hostname = COALESCE(excluded.hostname, hostname)
+            ''', (ip, int(ipaddress.ip_address(ip)), mac, _mac_vendor(mac), hostname, source))
+        else:
+            # Sans adresse MAC, l'observation la plus récente de l'IP est rafraîchie
+            cursor.execute('''
+                UPDATE device_inventory SET
+                    last_seen = CURRENT_TIMESTAMP, status = 'up', source = ?,
+                    hostname = COALESCE(?, hostname)
+                WHERE id = (SELECT id FROM device_inventory WHERE ip = ? ORDER BY last_seen DESC, id DESC LIMIT 1)
+            ''', (source, hostname, ip))
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    'INSERT INTO device_inventory (ip, ip_int, hostname, source) VALUES (?, ?, ?, ?)',
+                    (ip, int(ipaddress.ip_address(ip)), hostname, source)
+                )
+    
+    sees_all = source == 'arp'
+    for ip in probed:
+        device = known.get(ip)
+        if device and device['status'] == 'up' and ip not in found and ip not in moved_from:
+            if not sees_all and device['mac']:
+                continue
+            delta['gone'].append({'ip': ip, 'mac': device['mac'] or None})
+            if sees_all:
+                cursor.execute("UPDATE device_inventory SET status = 'down' WHERE ip = ?", (ip,))
+            else:
+                cursor.execute("UPDATE device_inventory SET status = 'down' WHERE ip = ? AND mac = ''", (ip,))
     
+    conn.commit()
+    conn.close()
+    return delta
+
+def _parse_subnet(subnet):
+    """Valide un sous-réseau CIDR et renvoie (réseau, erreur)"""
     if not subnet:
-        return jsonify({'error': 'Sous-réseau non spécifié'}), 400
+        return None, (jsonify({'error': 'Sous-réseau non spécifié'}), 400)
     
     try:
         # Validation du format du sous-réseau
-        ipaddress.ip_network(subnet)
+        network = ipaddress.ip_network(subnet, strict=False)
     except ValueError:
-        return jsonify({'error': 'Format de sous-réseau invalide. Utilisez le format CIDR (ex: 192.168.1.0/24)'}), 400
+        return None, (jsonify({'error': 'Format de sous-réseau invalide. Utilisez le format CIDR (ex: 192.168.1.0/24)'}), 400)
+    
+    if network.version != 4:
+        return None, (jsonify({'error': 'La découverte ARP ne concerne que les sous-réseaux IPv4'}), 400)
+    if network.num_addresses > MAX_ARP_ADDRESSES:
+        return None, (jsonify({'error': f'Sous-réseau trop large. Limitez à {MAX_ARP_ADDRESSES} adresses (/16).'}), 400)
+    
+    return network, None
+
+def _arp_rate(data):
+    """Cadence d'envoi ARP demandée, bornée par la configuration"""
+    max_rate = current_app.config.get('ARP_SCAN_RATE', DEFAULT_ARP_RATE)
+    try:
+        return min(max_rate, max(1, int(data.get('rate', max_rate))))
+    except (TypeError, ValueError):
+        return max_rate
+
+def _arp_request(pdst):
+    """Découverte ARP en un seul srp (sous-réseau CIDR ou liste d'adresses)"""
+    # Création d'un paquet ARP pour scanner le réseau
+    arp = ARP(pdst=pdst)
+    ether = Ether(dst="ff:ff:ff:ff:ff:ff")  # Broadcast MAC
+    packet = ether/arp
+    
+    # Envoi des paquets et réception des réponses
+    result = srp(packet, timeout=3, verbose=0)[0]
+    
+    # Extraction des résultats
+    return [{'ip': received.psrc, 'mac': received.hwsrc} for sent, received in result]
+
+@network_blueprint.route('/scan-local', methods=['POST'])
+def scan_local_network():
+    """Scanne le réseau local en utilisant Scapy pour ARP discovery"""
+    subnet = request.json.get('subnet')  # Format attendu: '192.168.1.0/24'
+    
+    network, error = _parse_subnet(subnet)
+    if error:
+        return error
+    
+    low, high = int(network.network_address), int(network.broadcast_address)
+    incremental = request.json.get('incremental', False)
     
     try:
-        # Création d'un paquet ARP pour scanner le réseau
-        arp = ARP(pdst=subnet)
-        ether = Ether(dst="ff:ff:ff:ff:ff:ff")  # Broadcast MAC
-        packet = ether/arp
-        
-        # Envoi des paquets et réception des réponses
-        result = srp(packet, timeout=3, verbose=0)[0]
-        
-        # Extraction des résultats
         devices = []
-        for sent, received in result:
-            devices.append({
-                'ip': received.psrc,
-                'mac': received.hwsrc
-            })
+        probed = [str(host) for host in network.hosts()]
+        if incremental:
+            # Mode incrémental : appareils connus et tranche tournante des autres
+            # adresses, avec une attente courte qui s'arrête dès que les
+            # appareils connus ont tous répondu
+            probed, known = _incremental_hosts(probed, 'arp', low, high, request.json.get('known_only', False))
+            if probed:
+                devices = list(iter_arp_discovery(network, rate=_arp_rate(request.json), hosts=probed,
+                                                  timeout=INCREMENTAL_ARP_TIMEOUT, expected=known))
+        elif network.num_addresses > ARP_CHUNK_SIZE:
+            # Grands sous-réseaux : découverte par tranches à cadence limitée
+            devices = list(iter_arp_discovery(network, rate=_arp_rate(request.json)))
+        else:
+            devices = _arp_request(subnet)
+        
+        # Mise à jour de l'inventaire et calcul des changements
+        delta = update_inventory(devices, probed, 'arp', low, high)
         
         # Log de l'activité
         log_activity('network_analyzer', 'scan_local', 
@@ -49,92 +520,220 @@ def scan_local_network():
         return jsonify({
             'subnet': subnet,
             'devices_found': len(devices),
-            'devices': devices
+            'devices': devices,
+            'delta': delta
         })
     except Exception as e:
         return jsonify({'error': f'Erreur lors du scan du réseau local: {str(e)}'}), 500
 
-@network_blueprint.route('/ping-sweep', methods=['POST'])
-def ping_sweep():
-    """Effectue un ping sweep sur une plage d'adresses IP"""
-    ip_range = request.json.get('ip_range')  # Format attendu: '192.168.1.1-192.168.1.254' ou '192.168.1.0/24'
+@network_blueprint.route('/scan-local/stream', methods=['POST'])
+def stream_scan_local_network():
+    """Découverte ARP en flux : chaque appareil est émis dès sa réponse"""
+    subnet = request.json.get('subnet')
+    fmt = request.json.get('format', 'ndjson')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    network, error = _parse_subnet(subnet)
+    if error:
+        return error
+    rate = _arp_rate(request.json)
+    low, high = int(network.network_address), int(network.broadcast_address)
+    
+    hosts = known = None
+    timeout = DEFAULT_ARP_TIMEOUT
+    if request.json.get('incremental', False):
+        # Mode incrémental : appareils connus et tranche tournante des autres adresses
+        hosts, known = _incremental_hosts([str(host) for host in network.hosts()], 'arp', low, high,
+                                          request.json.get('known_only', False))
+        timeout = INCREMENTAL_ARP_TIMEOUT
+    
+    def generate():
+        devices = []
+        try:
+            for device in iter_arp_discovery(network, rate=rate, hosts=hosts, timeout=timeout, expected=known):
+                devices.append(device)
+                yield {'type': 'device', **device}
+        except Exception as e:
+            yield {'type': 'error', 'error': f'Erreur lors du scan du réseau local: {str(e)}'}
+            return
+        
+        probed = hosts if hosts is not None else (str(host) for host in network.hosts())
+        delta = update_inventory(devices, probed, 'arp', low, high)
+        
+        log_activity('network_analyzer', 'scan_local_stream', 
+                     f"Subnet: {subnet}", 
+                     f"Appareils trouvés: {len(devices)}")
+        
+        yield {'type': 'delta', **delta}
+        yield {'type': 'summary', 'subnet': subnet, 'devices_found': len(devices)}
     
+    return stream_response(generate(), fmt)
+
+def _parse_ip_range(ip_range):
+    """Convertit une plage ('a.b.c.d-e.f.g.h' ou CIDR) en liste d'adresses.
+    Renvoie (liste, erreur)"""
     if not ip_range:
-        return jsonify({'error': 'Plage d\'IP non spécifiée'}), 400
+        return None, (jsonify({'error': 'Plage d\'IP non spécifiée'}), 400)
+    
+    too_large = (jsonify({'error': f'Plage d\'IP trop large. Limitez à {MAX_SWEEP_ADDRESSES} adresses maximum.'}), 400)
     
     # Conversion en liste d'adresses IP
     ip_list = []
     try:
         if '/' in ip_range:  # Format CIDR
             network = ipaddress.ip_network(ip_range, strict=False)
+            if network.num_addresses > MAX_SWEEP_ADDRESSES:
+                return None, too_large
             ip_list = [str(ip) for ip in network.hosts()]
         elif '-' in ip_range:  # Format plage
             start_ip, end_ip = ip_range.split('-')
             start = ipaddress.IPv4Address(start_ip.strip())
             end = ipaddress.IPv4Address(end_ip.strip())
+            if int(end) - int(start) >= MAX_SWEEP_ADDRESSES:
+                return None, too_large
             ip_list = [str(ipaddress.IPv4Address(ip)) for ip in range(int(start), int(end) + 1)]
         else:
-            return jsonify({'error': 'Format de plage d\'IP invalide'}), 400
-            
-        # Limiter le nombre d'adresses IP pour éviter les abus
-        if len(ip_list) > 255:
-            return jsonify({'error': 'Plage d\'IP trop large. Limitez à 255 adresses maximum.'}), 400
-            
+            return None, (jsonify({'error': 'Format de plage d\'IP invalide'}), 400)
     except Exception as e:
-        return jsonify({'error': f'Erreur lors du parsing de la plage d\'IP: {str(e)}'}), 400
+        return None, (jsonify({'error': f'Erreur lors du parsing de la plage d\'IP: {str(e)}'}), 400)
     
-    # Fonction pour ping une adresse IP
-    def ping_ip(ip):
-        try:
-            # Option -c 1: envoyer 1 paquet, -W 1: timeout de 1 seconde
-            if subprocess.call(['ping', '-c', '1', '-W', '1', ip], 
-                              stdout=subprocess.DEVNULL, 
-                              stderr=subprocess.DEVNULL) == 0:
-                return True
-            return False
-        except:
-            return False
-    
-    # Ping en parallèle
-    active_hosts = []
-    threads = []
-    results = {ip: False for ip in ip_list}
+    return ip_list, None
+
+def _prepare_sweep(ip_list):
+    """Choisit la méthode de sweep et renvoie (itérateur des hôtes actifs, erreur)"""
+    # Ping de toute la plage depuis une seule socket ICMP (IPv4 uniquement)
+    if all(':' not in ip for ip in ip_list) and _icmp_available():
+        rate = current_app.config.get('ICMP_SWEEP_RATE', DEFAULT_ICMP_RATE)
+        return iter_icmp_sweep(ip_list, rate=rate), None
     
-    def ping_worker(ip):
-        results[ip] = ping_ip(ip)
+    # Repli sur la commande ping lorsque les sockets ICMP sont indisponibles
+    if len(ip_list) > MAX_SUBPROCESS_SWEEP_ADDRESSES:
+        return None, (jsonify({'error': f'Sockets ICMP indisponibles : limitez la plage à {MAX_SUBPROCESS_SWEEP_ADDRESSES} adresses.'}), 400)
+    return iter(_subprocess_sweep(ip_list)), None
+
+@network_blueprint.route('/ping-sweep', methods=['POST'])
+def ping_sweep():
+    """Effectue un ping sweep sur une plage d'adresses IP"""
+    ip_range = request.json.get('ip_range')  # Format attendu: '192.168.1.1-192.168.1.254' ou '192.168.1.0/24'
     
-    for ip in ip_list:
-        thread = threading.Thread(target=ping_worker, args=(ip,))
-        threads.append(thread)
-        thread.start()
+    ip_list, error = _parse_ip_range(ip_range)
+    if error:
+        return error
     
-    # Attendre la fin de tous les pings
-    for thread in threads:
-        thread.join(timeout=5)
+    # L'inventaire ne suit que les adresses IPv4
+    track = bool(ip_list) and all(':' not in ip for ip in ip_list)
+    if track:
+        low, high = int(ipaddress.ip_address(ip_list[0])), int(ipaddress.ip_address(ip_list[-1]))
     
-    # Recueillir les résultats
-    active_hosts = [ip for ip in ip_list if results[ip]]
+    probed = ip_list
+    if track and request.json.get('incremental', False):
+        # Mode incrémental : hôtes connus et tranche tournante des autres adresses
+        probed, _ = _incremental_hosts(ip_list, 'ping', low, high, request.json.get('known_only', False))
+    
+    alive_hosts, error = _prepare_sweep(probed)
+    if error:
+        return error
+    alive = set(alive_hosts)
+    active_hosts = [ip for ip in ip_list if ip in alive]
     
     # Log de l'activité
     log_activity('network_analyzer', 'ping_sweep', 
                  f"Plage: {ip_range} ({len(ip_list)} adresses)", 
                  f"Hôtes actifs trouvés: {len(active_hosts)}")
     
-    # Tentative de résolution des noms d'hôtes pour les IP actives
-    hosts_with_names = []
-    for ip in active_hosts:
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-        except:
-            hostname = "Unknown"
-        hosts_with_names.append({
-            'ip': ip,
-            'hostname': hostname
-        })
+    # Résolution concurrente des noms d'hôtes pour les IP actives
+    hostnames = dict(iter_hostnames(active_hosts))
+    hosts_with_names = [{'ip': ip, 'hostname': hostnames[ip]} for ip in active_hosts]
     
-    return jsonify({
+    result = {
         'ip_range': ip_range,
         'total_ips': len(ip_list),
         'active_hosts': len(active_hosts),
         'hosts': hosts_with_names
-    })
\ No newline at end of file
+    }
+    if track:
+        # Mise à jour de l'inventaire et calcul des changements
+        result['delta'] = update_inventory(hosts_with_names, probed, 'ping', low, high)
+    
+    return jsonify(result)
+
+@network_blueprint.route('/ping-sweep/stream', methods=['POST'])
+def stream_ping_sweep():
+    """Ping sweep en flux : les hôtes actifs sont émis dès leur réponse ('alive'),
+    puis chaque nom d'hôte dès sa résolution ('host'), sans attendre les plus lents"""
+    ip_range = request.json.get('ip_range')
+    fmt = request.json.get('format', 'ndjson')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    ip_list, error = _parse_ip_range(ip_range)
+    if error:
+        return error
+    
+    alive_hosts, error = _prepare_sweep(ip_list)
+    if error:
+        return error
+    
+    def generate():
+        active_hosts = []
+        for ip in alive_hosts:
+            active_hosts.append(ip)
+            yield {'type': 'alive', 'ip': ip}
+        
+        log_activity('network_analyzer', 'ping_sweep_stream', 
+                     f"Plage: {ip_range} ({len(ip_list)} adresses)", 
+                     f"Hôtes actifs trouvés: {len(active_hosts)}")
+        
+        hosts = []
+        for ip, hostname in iter_hostnames(active_hosts):
+            hosts.append({'ip': ip, 'hostname': hostname})
+            yield {'type': 'host', 'ip': ip, 'hostname': hostname}
+        
+        if ip_list and all(':' not in ip for ip in ip_list):
+            delta = update_inventory(hosts, ip_list, 'ping', int(ipaddress.ip_address(ip_list[0])),
+                                     int(ipaddress.ip_address(ip_list[-1])))
+            yield {'type': 'delta', **delta}
+        
+        yield {
+            'type': 'summary',
+            'ip_range': ip_range,
+            'total_ips': len(ip_list),
+            'active_hosts': len(active_hosts)
+        }
+    
+    return stream_response(generate(), fmt)
+
+@network_blueprint.route('/inventory', methods=['GET'])
+def list_inventory():
+    """Liste l'inventaire des appareils découverts (filtres optionnels: subnet, status)"""
+    subnet = request.args.get('subnet')
+    status = request.args.get('status')
+    
+    query = 'SELECT ip, mac, vendor, hostname, source, status, first_seen, last_seen FROM device_inventory'
+    conditions = []
+    params = []
+    if subnet:
+        try:
+            network = ipaddress.ip_network(subnet, strict=False)
+        except ValueError:
+            return jsonify({'error': 'Format de sous-réseau invalide. Utilisez le format CIDR (ex: 192.168.1.0/24)'}), 400
+        conditions.append('ip_int BETWEEN ? AND ?')
+        params += [int(network.network_address), int(network.broadcast_address)]
+    if status:
+        conditions.append('status = ?')
+        params.append(status)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY ip_int'
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    devices = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    
+    return jsonify({
+        'count': len(devices),
+        'devices': devices
+    })
@@ -0,0 +1,330 @@
+# modules/osint_jobs.py - Tâches OSINT groupées en arrière-plan (listes d'emails ou de pseudos)
+
+from flask import Blueprint, request, jsonify, current_app
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import io
+import json
+import re
+import threading
+import uuid
+from database import get_db_connection, log_activity
+from streaming import stream_response
+from modules.osint_tools import collect_email_osint, collect_username_osint, load_platforms
+
+osint_jobs_blueprint = Blueprint('osint_jobs', __name__)
+
+# Limites des tâches groupées
+JOB_KINDS = ('email', 'username')
+MAX_JOB_ITEMS = 50000
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_DEADLINE = 60
+
+# Threads des vérifications des fournisseurs pour toutes les tâches groupées,
+# distincts de ceux des recherches interactives, que les tâches ne retardent pas
+JOB_CHECKS_WORKERS = 32
+_job_checks_pool = ThreadPoolExecutor(max_workers=JOB_CHECKS_WORKERS, thread_name_prefix='osint-job')
+
+# Tâches en cours d'exécution dans ce processus : id -> thread
+_runners = {}
+_runners_lock = threading.Lock()
+
+def _parse_identifiers(kind, content, filename=''):
+    """Liste d'identifiants depuis un contenu JSON (liste) ou CSV.
+    En CSV, la colonne nommée comme kind est utilisée si l'en-tête existe,
+    sinon la première colonne"""
+    if filename.endswith('.json'):
+        items = json.loads(content)
+        if not isinstance(items, list):
+            raise ValueError('liste JSON attendue')
+        return [str(item) for item in items]
+    
+    rows = [row for row in csv.reader(io.StringIO(content)) if row]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = 0
+    if kind in header:
+        column = header.index(kind)
+        rows = rows[1:]
+    return [row[column] for row in rows if len(row) > column]
+
+def _invalid(kind, identifier):
+    """Message d'erreur si l'identifiant est invalide, sinon None"""
+    if kind == 'email' and not re.match(r"[^@]+@[^@]+\.[^@]+", identifier):
+        return 'Adresse email invalide'
+    if kind == 'username' and len(identifier) < 3:
+        return 'Nom d\'utilisateur invalide (minimum 3 caractères)'
+    return None
+
+@osint_jobs_blueprint.route('', methods=['POST'])
+def create_job():
+    """Crée une tâche groupée : JSON {'kind', 'items'} (liste de textes, ou
+    texte CSV) ou {'kind', 'csv'}, ou formulaire avec 'kind' et un fichier
+    'file' (CSV ou .json). La tâche démarre aussitôt en arrière-plan"""
+    data = request.get_json(silent=True)
+    try:
+        if data is not None:
+            kind = data.get('kind')
+            items = data.get('items')
+            if items is None:
+                items = data.get('csv', '')
+            if isinstance(items, str):
+                items = _parse_identifiers(kind, items)
+            elif not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                return jsonify({'error': 'items doit être une liste d\'identifiants (textes) ou un texte CSV'}), 400
+        else:
+            kind = request.form.get('kind')
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({'error': 'Aucun fichier fourni'}), 400
+            items = _parse_identifiers(kind, upload.read().decode('utf-8-sig'), upload.filename or '')
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Liste invalide: {str(e)}'}), 400
+    
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Type de tâche invalide. Valeurs acceptées: {", ".join(JOB_KINDS)}'}), 400
+    
+    # Identifiants sans doublons, dans l'ordre de la liste
+    items = list(dict.fromkeys(str(item).strip() for item in items if item and str(item).strip()))
+    if not items:
+        return jsonify({'error': 'Liste vide'}), 400
+    if len(items) > MAX_JOB_ITEMS:
+        return jsonify({'error': f'Trop d\'éléments. Limitez à {MAX_JOB_ITEMS} éléments uniques.'}), 400
+    
+    # Les identifiants invalides sont enregistrés directement en erreur
+    job_id = uuid.uuid4().hex
+    rows = []
+    errors = 0
+    for position, identifier in enumerate(items):
+        error = _invalid(kind, identifier)
+        if error:
+            errors += 1
+            rows.append((job_id, position, identifier, 'error', json.dumps({'error': error})))
+        else:
+            rows.append((job_id, position, identifier, 'pending', None))
+    
+    conn = get_db_connection()
+    with conn:
+        conn.execute('INSERT INTO osint_jobs (id, kind, total, done, errors) VALUES (?, ?, ?, ?, ?)',
+                     (job_id, kind, len(items), errors, errors))
+        conn.executemany(
+            'INSERT INTO osint_job_items (job_id, position, identifier, status, result) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+    conn.close()
+    
+    # Log de l'activité
+    log_activity('osint', 'bulk_job', f"{kind}: {len(items)} éléments", job_id)
+    
+    _start(job_id, kind)
+    return jsonify(_job_progress(job_id)), 202
+
+def _settings():
+    """Paramètres lus dans la configuration au lancement (les workers n'ont pas
+    de contexte d'application)"""
+    config = current_app.config
+    return {
+        'hibp_api_key': config.get('HIBP_API_KEY', ''),
+        'workers': config.get('OSINT_JOB_WORKERS', DEFAULT_JOB_WORKERS),
+        'deadline': config.get('OSINT_JOB_DEADLINE', DEFAULT_JOB_DEADLINE)
+    }
+
+def _start(job_id, kind, retry=False):
+    """Lance (ou relance) le traitement des éléments en attente d'une tâche ;
+    avec retry, les éléments à relancer sont remis en attente"""
+    settings = _settings()
+    with _runners_lock:
+        if job_id in _runners:
+            return False
+        thread = _runners[job_id] = threading.Thread(target=_run_job, args=(job_id, kind, settings), daemon=True)
+    
+    conn = get_db_connection()
+    with conn:
+        if retry:
+            requeued = conn.execute(
+                "UPDATE osint_job_items SET status = 'pending' WHERE job_id = ? AND status = 'retry'",
+                (job_id,)
+            ).rowcount
+            conn.execute('UPDATE osint_jobs SET done = done - ?, finished_at = NULL WHERE id = ?',
+                         (requeued, job_id))
+        conn.execute("UPDATE osint_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                     (job_id,))
+    conn.close()
+    thread.start()
+    return True
+
+def _process(kind, identifier, settings, platforms):
+    """Interroge tous les fournisseurs pour un identifiant ; renvoie le
+    résultat et son statut : 'retry' si un fournisseur a subi un échec
+    temporaire (délai dépassé, limite de débit, connexion, 429/5xx), sinon
+    'done' (les erreurs définitives, comme une réponse 4xx, sont conservées)"""
+    if kind == 'email':
+        result = collect_email_osint(identifier, settings['hibp_api_key'], settings['deadline'], _job_checks_pool)
+    else:
+        result = collect_username_osint(identifier, platforms, settings['deadline'], _job_checks_pool)
+    transient = any(isinstance(section, dict) and (section.get('timed_out') or section.get('transient'))
+                    for section in result.values())
+    return result, 'retry' if transient else 'done'
+
+def _run_job(job_id, kind, settings):
+    """Traite les éléments en attente par lots, sur un pool de workers (les
+    limites de débit des fournisseurs s'appliquent via le client HTTP) ;
+    chaque résultat est enregistré dès qu'il est connu. Une mise en pause
+    est prise en compte entre deux lots"""
+    workers = settings['workers']
+    platforms = load_platforms() if kind == 'username' else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                conn = get_db_connection()
+                status = conn.execute('SELECT status FROM osint_jobs WHERE id = ?', (job_id,)).fetchone()['status']
+                batch = conn.execute(
+                    "SELECT position, identifier FROM osint_job_items WHERE job_id = ? AND status = 'pending' "
+                    "ORDER BY position LIMIT ?",
+                    (job_id, workers * 4)
+                ).fetchall()
+                conn.close()
+                if status != 'running' or not batch:
+                    break
+                
+                futures = {executor.submit(_process, kind, row['identifier'], settings, platforms): row['position']
+                           for row in batch}
+                for future in as_completed(futures):
+                    try:
+                        result, item_status = future.result()
+                        _save_item(job_id, futures[future], item_status, result)
+                    except Exception as e:
+                        _save_item(job_id, futures[future], 'error', {'error': str(e)})
+        
+        conn = get_db_connection()
+        with conn:
+            finished = conn.execute(
+                "UPDATE osint_jobs SET status = 'completed', finished_at = CURRENT_TIMESTAMP, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running' AND done = total",
+                (job_id,)
+            ).rowcount
+        conn.close()
+        if finished:
+            job = _job_progress(job_id)
+            log_activity('osint', 'bulk_job_result', job_id,
+                         f"Éléments: {job['total']}, Erreurs: {job['errors']}, À relancer: {job['retryable']}")
+    except Exception as e:
+        conn = get_db_connection()
+        with conn:
+            conn.execute("UPDATE osint_jobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (job_id,))
+        conn.close()
+        log_activity('osint', 'bulk_job_error', job_id, str(e))
+    finally:
+        with _runners_lock:
+            _runners.pop(job_id, None)
+
+def _save_item(job_id, position, status, result):
+    """Enregistre le résultat d'un élément et la progression de la tâche (une
+    transaction). Un élément 'retry' compte comme traité, avec son résultat
+    partiel, jusqu'à ce qu'une reprise le remette en attente"""
+    conn = get_db_connection()
+    with conn:
+        conn.execute(
+            'UPDATE osint_job_items SET status = ?, result = ?, completed_at = CURRENT_TIMESTAMP '
+            'WHERE job_id = ? AND position = ?',
+            (status, json.dumps(result), job_id, position)
+        )
+        conn.execute(
+            'UPDATE osint_jobs SET done = done + 1, errors = errors + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (status == 'error', job_id)
+        )
+    conn.close()
+
+def _job_progress(job_id):
+    """État d'une tâche, ou None si elle n'existe pas. Une tâche 'running' sans
+    worker dans ce processus (redémarrage) est signalée 'interrupted' ;
+    'retryable' compte les éléments dont un fournisseur a échoué"""
+    conn = get_db_connection()
+    job = conn.execute('SELECT * FROM osint_jobs WHERE id = ?', (job_id,)).fetchone()
+    retryable = conn.execute(
+        "SELECT COUNT(*) FROM osint_job_items WHERE job_id = ? AND status = 'retry'", (job_id,)
+    ).fetchone()[0]
+    conn.close()
+    if job is None:
+        return None
+    
+    job = dict(job, retryable=retryable)
+    with _runners_lock:
+        if job['status'] == 'running' and job_id not in _runners:
+            job['status'] = 'interrupted'
+    job['pending'] = job['total'] - job['done']
+    job['progress'] = round(job['done'] / job['total'] * 100, 1) if job['total'] else 100.0
+    return job
+
+@osint_jobs_blueprint.route('', methods=['GET'])
+def list_jobs():
+    """Liste les tâches groupées les plus récentes"""
+    conn = get_db_connection()
+    rows = conn.execute('SELECT id FROM osint_jobs ORDER BY created_at DESC, rowid DESC LIMIT 50').fetchall()
+    conn.close()
+    return jsonify({'jobs': [_job_progress(row['id']) for row in rows]})
+
+@osint_jobs_blueprint.route('/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progression d'une tâche groupée"""
+    job = _job_progress(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    return jsonify(job)
+
+@osint_jobs_blueprint.route('/<job_id>/pause', methods=['POST'])
+def pause_job(job_id):
+    """Met une tâche en pause après le lot en cours ; les éléments traités sont conservés"""
+    conn = get_db_connection()
+    with conn:
+        updated = conn.execute(
+            "UPDATE osint_jobs SET status = 'paused', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+            (job_id,)
+        ).rowcount
+    conn.close()
+    if not updated:
+        return jsonify({'error': 'Tâche introuvable ou non en cours'}), 409
+    return jsonify(_job_progress(job_id))
+
+@osint_jobs_blueprint.route('/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Reprend une tâche en pause, interrompue ou en échec, à partir des
+    éléments encore en attente. Les éléments dont un fournisseur a échoué sont
+    relancés, y compris pour une tâche terminée"""
+    job = _job_progress(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    resumable = job['status'] in ('paused', 'interrupted', 'failed')
+    if not resumable and not (job['status'] == 'completed' and job['retryable']):
+        return jsonify({'error': f"Tâche non reprenable (état: {job['status']})"}), 409
+    
+    if not _start(job_id, job['kind'], retry=True):
+        return jsonify({'error': 'Tâche déjà en cours'}), 409
+    return jsonify(_job_progress(job_id))
+
+@osint_jobs_blueprint.route('/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Télécharge les résultats d'une tâche en NDJSON (éléments traités, dans
+    l'ordre de la liste)"""
+    if _job_progress(job_id) is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    
+    def generate():
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(
+                "SELECT position, identifier, status, result FROM osint_job_items "
+                "WHERE job_id = ? AND status != 'pending' ORDER BY position",
+                (job_id,)
+            )
+            for row in cursor:
+                yield {'type': 'result', 'position': row['position'], 'identifier': row['identifier'],
+                       'status': row['status'], 'result': json.loads(row['result'])}
+        finally:
+            conn.close()
+    
+    response = stream_response(generate(), 'ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename=osint-job-{job_id}.ndjson'
+    return response
\ No newline at end of file
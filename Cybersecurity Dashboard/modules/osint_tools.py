@@ -1,257 +1,579 @@
 # modules/osint_tools.py - Module d'outils OSINT
 
 from flask import Blueprint, request, jsonify, current_app
-import requests
+from http_client import http_client, RETRY_STATUSES
+from rate_limiter import rate_limiter, RateLimitTimeout
+from api_cache import api_cache
+from singleflight import inflight
+from streaming import stream_response, STREAM_FORMATS
 import json
 import re
+import os
+import time
+import hashlib
+import threading
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from database import log_activity
 
 osint_blueprint = Blueprint('osint_tools', __name__)
 
+# Délai par défaut accordé à chaque fournisseur (en secondes)
+DEFAULT_PROVIDER_DEADLINE = 5
+
+# Échecs d'un fournisseur qu'une nouvelle tentative peut résoudre (limite de
+# débit, erreur de connexion ou délai réseau ; requests.RequestException
+# dérive d'OSError)
+TRANSIENT_ERRORS = (RateLimitTimeout, OSError)
+
+# Threads partagés par les vérifications concurrentes des fournisseurs (recherches
+# interactives ; les tâches groupées ont leur propre pool)
+_checks_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix='osint')
+
+# Plateformes vérifiées par la recherche de nom d'utilisateur
+PLATFORMS_FILE = os.path.join(os.path.dirname(__file__), 'username_platforms.json')
+_platforms_cache = {}
+_platforms_lock = threading.Lock()
+
+# Recherche Shodan : résultats par page de l'API, pages émises au plus par un
+# flux, et champs disponibles ('data', la bannière complète, sur demande)
+SHODAN_PAGE_SIZE = 100
+MAX_SHODAN_STREAM_PAGES = 10
+SHODAN_FIELDS = ('ip', 'hostname', 'org', 'country', 'city', 'port', 'product', 'version', 'data')
+DEFAULT_SHODAN_FIELDS = SHODAN_FIELDS[:-1]
+
+def iter_checks(checks, deadline=DEFAULT_PROVIDER_DEADLINE, executor=None):
+    """Lance les vérifications {nom: fonction} en parallèle et émet (nom, résultat)
+    dans l'ordre d'arrivée.
+
+    deadline est un délai commun ou un dict nom -> délai (en secondes), compté
+    à partir du démarrage de chaque vérification (pas de l'attente d'un thread
+    libre). Une vérification qui le dépasse est émise comme expirée (son
+    résultat tardif est ignoré) ; une exception devient {'error': ...}, avec
+    'transient' si elle est temporaire (TRANSIENT_ERRORS).
+    executor remplace le pool partagé des recherches interactives.
+    """
+    limits = {name: deadline.get(name, DEFAULT_PROVIDER_DEADLINE) if isinstance(deadline, dict) else deadline
+              for name in checks}
+    started = {}
+    
+    def run(name, check):
+        started[name] = time.monotonic()
+        return check()
+    
+    executor = executor or _checks_pool
+    futures = {executor.submit(run, name, check): name for name, check in checks.items()}
+    pending = set(futures)
+    
+    def expires(future):
+        # Une vérification encore en file n'a pas d'échéance : elle est revue
+        # au plus tard après son délai
+        name = futures[future]
+        return started.get(name, time.monotonic()) + limits[name]
+    
+    while pending:
+        timeout = min(expires(future) for future in pending) - time.monotonic()
+        done, pending = wait(pending, timeout=max(0, timeout), return_when=FIRST_COMPLETED)
+        
+        for future in done:
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                error = {'error': str(e)}
+                if isinstance(e, TRANSIENT_ERRORS):
+                    error['transient'] = True
+                yield futures[future], error
+        
+        now = time.monotonic()
+        for future in [future for future in pending
+                       if futures[future] in started and started[futures[future]] + limits[futures[future]] <= now]:
+            pending.discard(future)
+            future.cancel()
+            name = futures[future]
+            yield name, {'error': f'Délai dépassé ({limits[name]} s)', 'timed_out': True}
+
 @osint_blueprint.route('/email-info', methods=['POST'])
 def email_osint():
-    """Recherche d'informations sur une adresse email"""
+    """Recherche d'informations sur une adresse email.
+
+    Les fournisseurs sont interrogés en parallèle, chacun avec un délai
+    (OSINT_PROVIDER_DEADLINE) ; un fournisseur en retard est marqué comme
+    expiré. Avec 'stream', chaque section est émise dès son arrivée.
+    """
     email = request.json.get('email')
+    stream = request.json.get('stream', False)
+    fmt = request.json.get('format', 'ndjson')
     
     if not email or not re.match(r"[^@]+@[^@]+\.[^@]+", email):
         return jsonify({'error': 'Adresse email invalide'}), 400
     
+    if stream and fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
     # Log de l'activité
     log_activity('osint', 'email_search', email)
     
+    hibp_api_key = current_app.config.get('HIBP_API_KEY', '')
+    deadline = current_app.config.get('OSINT_PROVIDER_DEADLINE', DEFAULT_PROVIDER_DEADLINE)
+    
+    def log_results(results):
+        log_activity('osint', 'email_search_result', email, json.dumps({
+            'haveibeenpwned': results['haveibeenpwned'] is not None and 'error' not in results['haveibeenpwned'],
+            'github': results['github'] is not None and 'error' not in results['github'],
+            'gravatar': results['gravatar'] is not None and 'error' not in results['gravatar']
+        }))
+    
+    if stream:
+        def generate():
+            results = _empty_email_results(email)
+            checks = email_checks(email, hibp_api_key, deadline)
+            for provider, section in iter_checks(checks, deadline):
+                results[provider] = section
+                yield {'type': 'provider', 'provider': provider, 'result': section}
+            log_results(results)
+            yield {'type': 'summary', 'email': email,
+                   'timed_out': [name for name in checks if results[name].get('timed_out')]}
+        
+        return stream_response(generate(), fmt)
+    
+    results = collect_email_osint(email, hibp_api_key, deadline)
+    
+    # Log des résultats
+    log_results(results)
+    
+    return jsonify(results)
+
+def _empty_email_results(email):
     # Structure pour les résultats
-    results = {
+    return {
         'email': email,
         'haveibeenpwned': None,
         'github': None,
         'gravatar': None
     }
-    
-    # Vérification avec HaveIBeenPwned
-    hibp_api_key = current_app.config.get('HIBP_API_KEY', '')
+
+def email_checks(email, hibp_api_key='', deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Vérifications à lancer pour une adresse email (HaveIBeenPwned seulement
+    avec une clé API)"""
+    checks = {
+        'github': lambda: _check_github_email(email, deadline),
+        'gravatar': lambda: _check_gravatar(email, deadline)
+    }
     if hibp_api_key:
-        try:
-            headers = {
-                'hibp-api-key': hibp_api_key,
-                'User-Agent': 'CyberSec-Platform'
-            }
-            response = requests.get(
-                f"https://haveibeenpwned.com/api/v3/breachedaccount/{email}",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                results['haveibeenpwned'] = {
-                    'breached': True,
-                    'breaches': response.json()
-                }
-            elif response.status_code == 404:
-                results['haveibeenpwned'] = {
-                    'breached': False,
-                    'message': 'Aucune fuite de données trouvée'
-                }
-            else:
-                results['haveibeenpwned'] = {
-                    'error': f'Erreur lors de la requête (code {response.status_code})'
-                }
-        except Exception as e:
-            results['haveibeenpwned'] = {'error': str(e)}
-    
-# Recherche sur GitHub (API publique)
-    try:
-        response = requests.get(
-            f"https://api.github.com/search/users?q={email}",
-            headers={'User-Agent': 'CyberSec-Platform'}
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results['github'] = {
-                'total_count': data.get('total_count', 0),
-                'users': [{'login': user['login'], 'url': user['html_url']} for user in data.get('items', [])]
-            }
-        else:
-            results['github'] = {
-                'error': f'Erreur lors de la requête (code {response.status_code})'
-            }
-    except Exception as e:
-        results['github'] = {'error': str(e)}
+        checks['haveibeenpwned'] = lambda: _check_hibp(email, hibp_api_key, deadline)
+    return checks
+
+def collect_email_osint(email, hibp_api_key='', deadline=DEFAULT_PROVIDER_DEADLINE, executor=None):
+    """Résultats de toutes les vérifications d'une adresse email (sans log)"""
+    results = _empty_email_results(email)
+    for provider, section in iter_checks(email_checks(email, hibp_api_key, deadline), deadline, executor):
+        results[provider] = section
+    return results
+
+def _http_error(message, response):
+    """Section d'erreur d'un fournisseur, marquée 'transient' si la réponse
+    (429, 5xx) peut changer en réessayant"""
+    error = {'error': message}
+    if response.status_code in RETRY_STATUSES:
+        error['transient'] = True
+    return error
+
+def _check_hibp(email, hibp_api_key, deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Vérification avec HaveIBeenPwned"""
+    headers = {
+        'hibp-api-key': hibp_api_key,
+        'User-Agent': 'CyberSec-Platform'
+    }
+    response = http_client.get(
+        'haveibeenpwned',
+        f"https://haveibeenpwned.com/api/v3/breachedaccount/{email}",
+        headers=headers,
+        timeout=deadline,
+        queue_timeout=deadline
+    )
     
-    # Recherche Gravatar
-    import hashlib
-    try:
-        # Hachage de l'email pour Gravatar
-        hashed_email = hashlib.md5(email.lower().encode()).hexdigest()
-        gravatar_url = f"https://www.gravatar.com/{hashed_email}.json"
-        
-        response = requests.get(
-            gravatar_url,
-            headers={'User-Agent': 'CyberSec-Platform'}
-        )
-        
-        if response.status_code == 200:
-            results['gravatar'] = {
-                'found': True,
-                'data': response.json()
-            }
-        else:
-            results['gravatar'] = {
-                'found': False,
-                'message': 'Profil Gravatar non trouvé'
-            }
-    except Exception as e:
-        results['gravatar'] = {'error': str(e)}
+    if response.status_code == 200:
+        return {
+            'breached': True,
+            'breaches': response.json()
+        }
+    elif response.status_code == 404:
+        return {
+            'breached': False,
+            'message': 'Aucune fuite de données trouvée'
+        }
+    else:
+        return _http_error(f'Erreur lors de la requête (code {response.status_code})', response)
+
+def _check_github_email(email, deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Recherche sur GitHub (API publique)"""
+    response = http_client.get(
+        'github',
+        f"https://api.github.com/search/users?q={email}",
+        headers={'User-Agent': 'CyberSec-Platform'},
+        timeout=deadline,
+        queue_timeout=deadline
+    )
     
-    # Log des résultats
-    log_activity('osint', 'email_search_result', email, json.dumps({
-        'haveibeenpwned': results['haveibeenpwned'] is not None and 'error' not in results['haveibeenpwned'],
-        'github': results['github'] is not None and 'error' not in results['github'],
-        'gravatar': results['gravatar'] is not None and 'error' not in results['gravatar']
-    }))
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            'total_count': data.get('total_count', 0),
+            'users': [{'login': user['login'], 'url': user['html_url']} for user in data.get('items', [])]
+        }
+    else:
+        return _http_error(f'Erreur lors de la requête (code {response.status_code})', response)
+
+def _check_gravatar(email, deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Recherche Gravatar"""
+    # Hachage de l'email pour Gravatar
+    hashed_email = hashlib.md5(email.lower().encode()).hexdigest()
+    gravatar_url = f"https://www.gravatar.com/{hashed_email}.json"
     
-    return jsonify(results)
+    response = http_client.get(
+        'gravatar',
+        gravatar_url,
+        headers={'User-Agent': 'CyberSec-Platform'},
+        timeout=deadline,
+        queue_timeout=deadline
+    )
+    
+    if response.status_code == 200:
+        return {
+            'found': True,
+            'data': response.json()
+        }
+    else:
+        return {
+            'found': False,
+            'message': 'Profil Gravatar non trouvé'
+        }
 
 @osint_blueprint.route('/username-info', methods=['POST'])
 def username_osint():
-    """Recherche d'informations sur un nom d'utilisateur"""
+    """Recherche d'informations sur un nom d'utilisateur.
+
+    Les plateformes (définies dans username_platforms.json) sont vérifiées en
+    parallèle, chacune avec son délai et son débit maximal ; 'platforms'
+    restreint la liste. Avec 'stream', chaque profil trouvé est émis dès
+    qu'il est confirmé.
+    """
     username = request.json.get('username')
+    selected = request.json.get('platforms')
+    stream = request.json.get('stream', False)
+    fmt = request.json.get('format', 'ndjson')
     
     if not username or len(username) < 3:
         return jsonify({'error': 'Nom d\'utilisateur invalide (minimum 3 caractères)'}), 400
     
+    if stream and fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    platforms = load_platforms()
+    if selected:
+        unknown = [name for name in selected if name not in platforms]
+        if unknown:
+            return jsonify({'error': f'Plateforme inconnue. Valeurs acceptées: {", ".join(platforms)}'}), 400
+        platforms = {name: platforms[name] for name in selected}
+    
     # Log de l'activité
     log_activity('osint', 'username_search', username)
     
-    # Structure pour les résultats
-    results = {
-        'username': username,
-        'github': None,
-        'twitter': None,
-        'reddit': None
-    }
-    
-    # Recherche sur GitHub
-    try:
-        response = requests.get(
-            f"https://api.github.com/users/{username}",
-            headers={'User-Agent': 'CyberSec-Platform'}
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            results['github'] = {
-                'found': True,
-                'name': data.get('name'),
-                'company': data.get('company'),
-                'blog': data.get('blog'),
-                'location': data.get('location'),
-                'email': data.get('email'),
-                'bio': data.get('bio'),
-                'public_repos': data.get('public_repos'),
-                'followers': data.get('followers'),
-                'created_at': data.get('created_at'),
-                'url': data.get('html_url')
-            }
-        else:
-            results['github'] = {
-                'found': False,
-                'message': 'Utilisateur GitHub non trouvé'
-            }
-    except Exception as e:
-        results['github'] = {'error': str(e)}
+    default_deadline = current_app.config.get('OSINT_PROVIDER_DEADLINE', DEFAULT_PROVIDER_DEADLINE)
     
-    # Vérification simplifiée des autres plateformes (sans API officielle)
-    # Note: Ces vérifications sont basiques et peuvent donner des faux positifs
+    def log_results(results):
+        log_activity('osint', 'username_search_result', username, json.dumps({
+            name: results[name].get('found', False) for name in platforms
+        }))
     
-    # Vérification Reddit
-    try:
-        response = requests.get(
-            f"https://www.reddit.com/user/{username}/about.json",
-            headers={'User-Agent': 'CyberSec-Platform'}
-        )
+    if stream:
+        def generate():
+            # Structure pour les résultats
+            results = {'username': username}
+            checks, deadlines = username_checks(username, platforms, default_deadline)
+            for name, result in iter_checks(checks, deadlines):
+                results[name] = result
+                if result.get('found'):
+                    yield {'type': 'hit', 'platform': name, 'result': result}
+                elif 'error' in result:
+                    yield {'type': 'error', 'platform': name, 'result': result}
+            log_results(results)
+            yield {'type': 'summary', 'username': username, 'checked': len(platforms),
+                   'found': [name for name in platforms if results[name].get('found')]}
         
-        if response.status_code == 200:
-            data = response.json()
-            user_data = data.get('data', {})
-            results['reddit'] = {
-                'found': True,
-                'name': user_data.get('name'),
-                'created_utc': user_data.get('created_utc'),
-                'karma': {
-                    'post': user_data.get('link_karma'),
-                    'comment': user_data.get('comment_karma')
-                },
-                'url': f"https://www.reddit.com/user/{username}"
-            }
-        else:
-            results['reddit'] = {
-                'found': False,
-                'message': 'Utilisateur Reddit non trouvé'
-            }
-    except Exception as e:
-        results['reddit'] = {'error': str(e)}
+        return stream_response(generate(), fmt)
+    
+    results = collect_username_osint(username, platforms, default_deadline)
     
     # Log des résultats
-    log_activity('osint', 'username_search_result', username, json.dumps({
-        'github': results['github'] is not None and results['github'].get('found', False),
-        'reddit': results['reddit'] is not None and results['reddit'].get('found', False),
-    }))
+    log_results(results)
     
     return jsonify(results)
 
+def username_checks(username, platforms, default_deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Vérifications à lancer pour un nom d'utilisateur ; renvoie (vérifications,
+    délais par plateforme)"""
+    deadlines = {name: definition.get('deadline', default_deadline) for name, definition in platforms.items()}
+    checks = {
+        name: (lambda name=name, definition=definition:
+               _check_platform(name, definition, username, deadlines[name]))
+        for name, definition in platforms.items()
+    }
+    return checks, deadlines
+
+def collect_username_osint(username, platforms=None, default_deadline=DEFAULT_PROVIDER_DEADLINE, executor=None):
+    """Résultats de toutes les plateformes pour un nom d'utilisateur (sans log)"""
+    if platforms is None:
+        platforms = load_platforms()
+    results = {'username': username}
+    checks, deadlines = username_checks(username, platforms, default_deadline)
+    for name, result in iter_checks(checks, deadlines, executor):
+        results[name] = result
+    return results
+
+def load_platforms(path=PLATFORMS_FILE):
+    """Définitions des plateformes vérifiées par username_osint (relues si le
+    fichier a changé). Le débit de chaque plateforme est confié au limiteur
+    partagé, sauf pour les fournisseurs qui y ont déjà un débit"""
+    mtime = os.path.getmtime(path)
+    with _platforms_lock:
+        cached = _platforms_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding='utf-8') as f:
+                cached = _platforms_cache[path] = (mtime, json.load(f))
+            for name, definition in cached[1].items():
+                if definition.get('rate_limit'):
+                    rate_limiter.configure(name, definition['rate_limit'], override=False)
+    return cached[1]
+
+def _signal(signal, response):
+    """Indique si le profil existe d'après la réponse : True, False, ou None si
+    la réponse ne permet pas de conclure"""
+    kind = signal.get('type', 'status')
+    if kind == 'status':
+        if response.status_code == signal.get('found', 200):
+            return True
+        if response.status_code in signal.get('missing', [404]):
+            return False
+        return None
+    
+    if response.status_code == 404:
+        return False
+    if response.status_code != 200:
+        return None
+    if kind == 'json_nonempty':
+        try:
+            return bool(response.json())
+        except ValueError:
+            return None
+    if kind == 'text_present':
+        return signal['text'] in response.text
+    if kind == 'text_absent':
+        return signal['text'] not in response.text
+    return None
+
+def _extract(data, path):
+    """Valeur d'un chemin pointé ('data.name', '0.name') dans une réponse JSON"""
+    for key in path.split('.'):
+        if isinstance(data, list):
+            data = data[int(key)] if key.isdigit() and int(key) < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+    return data
+
+def _check_platform(name, definition, username, deadline=DEFAULT_PROVIDER_DEADLINE):
+    """Vérifie l'existence de username sur une plateforme définie dans
+    username_platforms.json"""
+    quoted = quote(username, safe='')
+    response = http_client.get(
+        name,
+        definition['url'].format(username=quoted),
+        headers={'User-Agent': 'CyberSec-Platform'},
+        timeout=deadline,
+        queue_timeout=deadline
+    )
+    
+    found = _signal(definition.get('signal', {}), response)
+    if found is None:
+        return _http_error(f'Réponse inattendue de {definition["name"]} (code {response.status_code})', response)
+    if not found:
+        return {
+            'found': False,
+            'message': f'Utilisateur {definition["name"]} non trouvé'
+        }
+    
+    result = {'found': True}
+    if definition.get('fields'):
+        data = response.json()
+        for field, path in definition['fields'].items():
+            # Champ pointé ('karma.post') : valeur imbriquée dans la réponse
+            target = result
+            *parents, key = field.split('.')
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[key] = _extract(data, path)
+    if not result.get('url'):
+        result['url'] = definition.get('profile_url', definition['url']).format(username=quoted)
+    return result
+
 @osint_blueprint.route('/shodan-search', methods=['POST'])
 def shodan_search():
-    """Recherche via l'API Shodan"""
+    """Recherche via l'API Shodan, page par page.
+
+    'cursor' est le numéro de page (renvoyé en 'next_cursor'), 'fields' la
+    liste des champs voulus pour chaque résultat ('data', la bannière
+    complète, seulement sur demande). Les pages sont conservées en cache ;
+    avec 'prefetch' (par défaut SHODAN_PREFETCH), la suivante est préchargée
+    en arrière-plan. Avec 'stream', les résultats de 'max_pages' pages sont
+    émis au fur et à mesure, et le préchargement s'arrête à la dernière.
+    """
     query = request.json.get('query')
+    cursor = request.json.get('cursor', 1)
+    fields = request.json.get('fields') or DEFAULT_SHODAN_FIELDS
+    stream = request.json.get('stream', False)
+    fmt = request.json.get('format', 'ndjson')
+    max_pages = request.json.get('max_pages', 1)
+    prefetch = request.json.get('prefetch', current_app.config.get('SHODAN_PREFETCH', False))
     
     if not query:
         return jsonify({'error': 'Requête non spécifiée'}), 400
     
-    # Log de l'activité
-    log_activity('osint', 'shodan_search', query)
+    try:
+        page = int(cursor)
+        max_pages = int(max_pages)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Curseur ou nombre de pages invalide'}), 400
+    if page < 1 or not 1 <= max_pages <= MAX_SHODAN_STREAM_PAGES:
+        return jsonify({'error': f'Curseur ou nombre de pages invalide (1 à {MAX_SHODAN_STREAM_PAGES} pages)'}), 400
+    
+    unknown = [field for field in fields if field not in SHODAN_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Champ invalide. Valeurs acceptées: {", ".join(SHODAN_FIELDS)}'}), 400
+    
+    if stream and fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
     
     shodan_api_key = current_app.config.get('SHODAN_API_KEY', '')
     if not shodan_api_key:
         return jsonify({'error': 'Clé API Shodan non configurée'}), 500
     
-    try:
-        # Recherche Shodan
-        response = requests.get(
-            f"https://api.shodan.io/shodan/host/search?key={shodan_api_key}&query={query}"
+    # Les recherches identiques (aux espaces de début et de fin près) partagent
+    # leur appel à Shodan ; les espaces internes peuvent être significatifs
+    # (valeurs entre guillemets) et sont conservés
+    query = query.strip()
+    
+    # Dernière page qui sera lue : en flux, rien n'est préchargé au-delà de max_pages
+    last_page = page + max_pages - 1 if stream else page + 1
+    
+    def load(page):
+        (data, status), shared = inflight.do(('shodan', query, page),
+                                             lambda: _shodan_page(query, page, shodan_api_key))
+        if status == 200:
+            next_cursor = page + 1 if page * SHODAN_PAGE_SIZE < data['total'] else None
+            if prefetch and next_cursor is not None and next_cursor <= last_page:
+                _prefetch_shodan_page(query, next_cursor, shodan_api_key)
+            data = dict(data, next_cursor=next_cursor)
+        return data, status, shared
+    
+    data, status, shared = load(page)
+    
+    # Log de l'activité (une entrée par recherche, pas par page ni par demande regroupée)
+    if page == 1 and not shared:
+        log_activity('osint', 'shodan_search', query)
+    
+    if status != 200:
+        return jsonify(data), status
+    
+    if not stream:
+        return jsonify({
+            'query': query,
+            'total': data['total'],
+            'page': page,
+            'next_cursor': data['next_cursor'],
+            'matches': [_select_fields(match, fields) for match in data['matches']]
+        })
+    
+    def generate():
+        current, result, pages = page, data, 0
+        while True:
+            pages += 1
+            for match in result['matches']:
+                yield {'type': 'match', 'page': current, **_select_fields(match, fields)}
+            
+            if result['next_cursor'] is None or pages == max_pages:
+                break
+            current = result['next_cursor']
+            result, status, _ = load(current)
+            if status != 200:
+                yield {'type': 'error', 'page': current, 'error': result['error']}
+                return
+        
+        yield {'type': 'summary', 'query': query, 'total': result['total'],
+               'pages': pages, 'next_cursor': result['next_cursor']}
+    
+    return stream_response(generate(), fmt)
+
+class _ShodanError(Exception):
+    """Réponse d'erreur de Shodan (non mise en cache)"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _shodan_page(query, page, shodan_api_key):
+    """Page de résultats formatés, depuis le cache ou Shodan ; renvoie
+    (réponse JSON, code HTTP)"""
+    def fetch():
+        # Recherche Shodan (une page de SHODAN_PAGE_SIZE résultats)
+        response = http_client.get(
+            'shodan',
+            'https://api.shodan.io/shodan/host/search',
+            params={'key': shodan_api_key, 'query': query, 'page': page}
         )
+        if response.status_code != 200:
+            raise _ShodanError(response.status_code, f'Erreur Shodan ({response.status_code}): {response.text}')
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Formatage des résultats
-            formatted_results = {
-                'query': query,
-                'total': data.get('total', 0),
-                'matches': []
-            }
-            
-            # Extraction des informations pertinentes
-            for match in data.get('matches', []):
-                formatted_results['matches'].append({
-                    'ip': match.get('ip_str'),
-                    'hostname': match.get('hostnames', []),
-                    'org': match.get('org'),
-                    'country': match.get('location', {}).get('country_name'),
-                    'city': match.get('location', {}).get('city'),
-                    'port': match.get('port'),
-                    'product': match.get('product'),
-                    'version': match.get('version'),
-                    'data': match.get('data')
-                })
-            
-            # Log des résultats
-            log_activity('osint', 'shodan_search_result', query, 
-                         f"Résultats trouvés: {data.get('total', 0)}")
-            
-            return jsonify(formatted_results)
-        else:
-            return jsonify({
-                'error': f'Erreur Shodan ({response.status_code}): {response.text}'
-            }), response.status_code
+        data = response.json()
+        
+        # Log des résultats
+        log_activity('osint', 'shodan_search_result', query, 
+                     f"Page {page}, résultats trouvés: {data.get('total', 0)}")
+        
+        return {
+            'total': data.get('total', 0),
+            'matches': [_format_match(match) for match in data.get('matches', [])]
+        }
+    
+    try:
+        return api_cache.get_or_fetch('shodan', f'{page}:{query}', fetch), 200
+    except _ShodanError as e:
+        return {'error': str(e)}, e.status
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la recherche Shodan: {str(e)}'}), 500
\ No newline at end of file
+        return {'error': f'Erreur lors de la recherche Shodan: {str(e)}'}, 500
+
+def _prefetch_shodan_page(query, page, shodan_api_key):
+    """Charge une page en arrière-plan, pour qu'elle soit en cache quand elle sera demandée"""
+    threading.Thread(
+        target=lambda: inflight.do(('shodan', query, page), lambda: _shodan_page(query, page, shodan_api_key)),
+        daemon=True
+    ).start()
+
+def _format_match(match):
+    """Extraction des informations pertinentes d'un résultat Shodan"""
+    return {
+        'ip': match.get('ip_str'),
+        'hostname': match.get('hostnames', []),
+        'org': match.get('org'),
+        'country': match.get('location', {}).get('country_name'),
+        'city': match.get('location', {}).get('city'),
+        'port': match.get('port'),
+        'product': match.get('product'),
+        'version': match.get('version'),
+        'data': match.get('data')
+    }
+
+def _select_fields(match, fields):
+    """Restreint un résultat formaté aux champs demandés"""
+    return {field: match.get(field) for field in fields}
\ No newline at end of file
@@ -1,15 +1,40 @@
 # modules/port_scanner.py - Module de scan de ports
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import socket
-import threading
+import selectors
+import errno
+import math
+import time
 import subprocess
+import tempfile
 import json
+import xml.etree.ElementTree as ET
+from collections import deque
 from database import log_activity
+from streaming import stream_response, STREAM_FORMATS
 import ipaddress
 
 port_blueprint = Blueprint('port_scanner', __name__)
 
+# Plafonds par défaut du moteur de scan (surchargés par la configuration de l'app)
+DEFAULT_MAX_IN_FLIGHT = 256
+DEFAULT_MAX_PER_HOST = 64
+DEFAULT_PROBE_BUDGET = 65536
+
+# Bornes par défaut des timeouts adaptatifs (en secondes)
+DEFAULT_TIMEOUT_FLOOR = 0.1
+DEFAULT_TIMEOUT_CEILING = 1
+
+# Nombre maximum de ports par cible
+MAX_PORTS_PER_SCAN = 1000
+
+# Ports scannés lorsqu'aucun port n'est spécifié
+COMMON_PORTS = [21, 22, 23, 25, 53, 80, 110, 139, 143, 443, 445, 1433, 3306, 3389, 5900, 8080]
+
+# Codes renvoyés par connect_ex() lorsqu'une connexion non bloquante est en cours
+_CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
 def scan_port_socket(ip, port, timeout=1):
     """Scan un port unique en utilisant socket"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -19,10 +44,151 @@ def scan_port_socket(ip, port, timeout=1):
     sock.close()
     return is_open
 
-@port_blueprint.route('/scan-socket', methods=['POST'])
-def scan_with_socket():
-    """Effectue un scan de ports en utilisant socket"""
-    data = request.json
+class AdaptiveTimeout:
+    """Timeout de connexion d'un hôte dérivé des RTT mesurés (à la manière de nmap).
+
+    Tant que moins de min_samples réponses ont été observées, le timeout initial
+    est utilisé ; ensuite timeout = srtt + 4 * rttvar, borné par [floor, ceiling].
+    """
+    
+    def __init__(self, initial=1, floor=DEFAULT_TIMEOUT_FLOOR,
+                 ceiling=DEFAULT_TIMEOUT_CEILING, min_samples=3):
+        self.initial = initial
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.samples = 0
+        self.srtt = None
+        self.rttvar = None
+    
+    def observe(self, rtt):
+        """Intègre un RTT mesuré (lissage de la RFC 6298)"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples += 1
+    
+    @property
+    def timeout(self):
+        if self.samples < self.min_samples:
+            return self.initial
+        return min(self.ceiling, max(self.floor, self.srtt + 4 * self.rttvar))
+
+def iter_connect_scan(targets, timeout=1, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                      max_per_host=DEFAULT_MAX_PER_HOST, adaptive=False,
+                      timeout_floor=DEFAULT_TIMEOUT_FLOOR, timeout_ceiling=DEFAULT_TIMEOUT_CEILING):
+    """Scanne une liste de couples (ip, port) avec des sockets non bloquantes
+    multiplexées dans une seule boucle de sélection.
+
+    Même sémantique que scan_port_socket (port ouvert si connect() aboutit avant
+    le timeout), mais sans thread par port : au plus max_in_flight sockets sont
+    ouvertes en même temps, dont au plus max_per_host vers une même IP.
+    Avec adaptive=True, le timeout de chaque hôte est recalculé à partir des RTT
+    des premiers ports qui répondent (ouverts ou refusés).
+    Génère des tuples (ip, port, is_open) au fur et à mesure des résultats.
+    """
+    # File de ports par hôte, servie à tour de rôle
+    queues = {}
+    for ip, port in targets:
+        queues.setdefault(ip, deque()).append(port)
+    hosts = deque(queues)
+    per_host = dict.fromkeys(queues, 0)
+    timings = {}
+    if adaptive:
+        timings = {ip: AdaptiveTimeout(timeout, timeout_floor, timeout_ceiling) for ip in queues}
+    selector = selectors.DefaultSelector()
+    
+    def finish(key):
+        selector.unregister(key.fileobj)
+        key.fileobj.close()
+        per_host[key.data[0]] -= 1
+    
+    try:
+        while hosts or selector.get_map():
+            # Lancer de nouvelles connexions tant que les plafonds le permettent
+            saturated = []
+            while hosts and len(selector.get_map()) < max_in_flight:
+                ip = hosts.popleft()
+                if per_host[ip] >= max_per_host:
+                    saturated.append(ip)
+                    continue
+                port = queues[ip].popleft()
+                if queues[ip]:
+                    hosts.append(ip)
+                
+                family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+                sock = None
+                try:
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    result = sock.connect_ex((ip, port))
+                except OSError:
+                    # Échec avant la connexion (famille d'adresses, plus de
+                    # descripteurs...) : la socket est libérée, le port noté fermé
+                    if sock is not None:
+                        sock.close()
+                    yield ip, port, False
+                    continue
+                if result in _CONNECT_IN_PROGRESS:
+                    started = time.monotonic()
+                    deadline = started + (timings[ip].timeout if adaptive else timeout)
+                    selector.register(sock, selectors.EVENT_WRITE, (ip, port, deadline, started))
+                    per_host[ip] += 1
+                else:
+                    sock.close()
+                    yield ip, port, result == 0
+            hosts.extendleft(reversed(saturated))
+            
+            if not selector.get_map():
+                continue
+            
+            # Attendre la prochaine connexion terminée ou la prochaine échéance
+            nearest = min(key.data[2] for key in selector.get_map().values())
+            for key, _ in selector.select(max(0, nearest - time.monotonic())):
+                ip, port, _, started = key.data
+                result = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                finish(key)
+                # Seules les vraies réponses (SYN/ACK ou RST) servent à mesurer le RTT
+                if adaptive and result in (0, errno.ECONNREFUSED):
+                    timings[ip].observe(time.monotonic() - started)
+                yield ip, port, result == 0
+            
+            # Les connexions sans réponse dans le délai sont considérées fermées
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                if key.data[2] <= now:
+                    finish(key)
+                    yield key.data[0], key.data[1], False
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+def _scan_options(data):
+    """Renvoie les options du moteur de scan (plafonds configurés et timeouts
+    adaptatifs demandés) sous la forme (options, erreur)"""
+    options = {
+        'max_in_flight': current_app.config.get('PORT_SCAN_MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT),
+        'max_per_host': current_app.config.get('PORT_SCAN_MAX_PER_HOST', DEFAULT_MAX_PER_HOST)
+    }
+    
+    if data.get('adaptive_timeout'):
+        try:
+            floor = float(data.get('timeout_floor', DEFAULT_TIMEOUT_FLOOR))
+            ceiling = float(data.get('timeout_ceiling', DEFAULT_TIMEOUT_CEILING))
+        except (TypeError, ValueError):
+            return None, (jsonify({'error': 'Bornes de timeout invalides'}), 400)
+        if not (math.isfinite(floor) and math.isfinite(ceiling)) or floor <= 0 or ceiling < floor or ceiling > 10:
+            return None, (jsonify({'error': 'Bornes de timeout invalides (0 < plancher <= plafond <= 10 s)'}), 400)
+        options.update(adaptive=True, timeout=ceiling, timeout_floor=floor, timeout_ceiling=ceiling)
+    
+    return options, None
+
+def _parse_socket_scan(data):
+    """Valide une requête de scan socket et renvoie (ip, ports, erreur)"""
     ip = data.get('ip')
     ports = data.get('ports', [])  # Liste de ports à scanner
     
@@ -30,34 +196,37 @@ def scan_with_socket():
     try:
         ipaddress.ip_address(ip)
     except ValueError:
-        return jsonify({'error': 'Adresse IP invalide'}), 400
+        return None, None, (jsonify({'error': 'Adresse IP invalide'}), 400)
     
     if not ports:
         # Si aucun port n'est spécifié, utiliser les ports courants
-        ports = [21, 22, 23, 25, 53, 80, 110, 139, 143, 443, 445, 1433, 3306, 3389, 5900, 8080]
+        ports = COMMON_PORTS
     
     # Limiter le nombre de ports à scanner pour éviter les abus
-    if len(ports) > 1000:
-        return jsonify({'error': 'Trop de ports demandés. Limitez à 1000 ports maximum.'}), 400
+    if len(ports) > MAX_PORTS_PER_SCAN:
+        return None, None, (jsonify({'error': f'Trop de ports demandés. Limitez à {MAX_PORTS_PER_SCAN} ports maximum.'}), 400)
     
-    results = {}
-    threads = []
+    return ip, ports, None
+
+@port_blueprint.route('/scan-socket', methods=['POST'])
+def scan_with_socket():
+    """Effectue un scan de ports en utilisant socket"""
+    ip, ports, error = _parse_socket_scan(request.json)
+    if error:
+        return error
     
-    # Utilisation de threads pour accélérer le scan
-    def scan_worker(port):
-        results[port] = scan_port_socket(ip, port)
+    options, error = _scan_options(request.json)
+    if error:
+        return error
     
-    for port in ports:
-        thread = threading.Thread(target=scan_worker, args=(port,))
-        threads.append(thread)
-        thread.start()
+    results = {}
     
-    # Attendre la fin de tous les scans
-    for thread in threads:
-        thread.join()
+    # Scan multiplexé dans une seule boucle, sans thread par port
+    for _, port, is_open in iter_connect_scan(((ip, port) for port in ports), **options):
+        results[port] = is_open
     
     # Formater les résultats
-    open_ports = {port: service for port, service in results.items() if results[port]}
+    open_ports = [port for port in ports if results[port]]
     
     # Log des résultats
     log_activity('port_scanner', 'socket_scan', 
@@ -67,14 +236,211 @@ def scan_with_socket():
     return jsonify({
         'ip': ip,
         'total_ports_scanned': len(ports),
-        'open_ports': [port for port in ports if results[port]],
+        'open_ports': open_ports,
         'closed_ports': [port for port in ports if not results[port]]
     })
 
-@port_blueprint.route('/scan-nmap', methods=['POST'])
-def scan_with_nmap():
-    """Effectue un scan de ports en utilisant nmap (nécessite nmap installé sur le serveur)"""
+@port_blueprint.route('/scan-socket/stream', methods=['POST'])
+def stream_scan_with_socket():
+    """Scan socket en flux : chaque port est émis dès que son état est connu,
+    suivi d'un enregistrement de synthèse (format 'ndjson' ou 'sse')"""
+    ip, ports, error = _parse_socket_scan(request.json)
+    if error:
+        return error
+    
+    fmt = request.json.get('format', 'ndjson')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    options, error = _scan_options(request.json)
+    if error:
+        return error
+    
+    def generate():
+        # Seuls les ports ouverts sont conservés pour la synthèse
+        open_ports = []
+        scanned = 0
+        for _, port, is_open in iter_connect_scan(((ip, port) for port in ports), **options):
+            scanned += 1
+            if is_open:
+                open_ports.append(port)
+            yield {'type': 'port', 'ip': ip, 'port': port, 'open': is_open}
+        
+        log_activity('port_scanner', 'socket_scan_stream', 
+                     f"IP: {ip}, Ports scannés: {scanned}", 
+                     f"Ports ouverts trouvés: {len(open_ports)}")
+        
+        yield {
+            'type': 'summary',
+            'ip': ip,
+            'total_ports_scanned': scanned,
+            'open_ports': sorted(open_ports),
+            'closed_count': scanned - len(open_ports)
+        }
+    
+    return stream_response(generate(), fmt)
+
+@port_blueprint.route('/scan-batch', methods=['POST'])
+def scan_batch():
+    """Scanne plusieurs cibles (liste d'IP et/ou CIDR) avec un pool de sockets partagé"""
     data = request.json
+    ips = data.get('ips', [])
+    cidr = data.get('cidr')
+    ports = data.get('ports', []) or COMMON_PORTS
+    budget = current_app.config.get('PORT_SCAN_PROBE_BUDGET', DEFAULT_PROBE_BUDGET)
+    
+    if not ips and not cidr:
+        return jsonify({'error': 'Aucune cible spécifiée (ips ou cidr)'}), 400
+    
+    if len(ports) > MAX_PORTS_PER_SCAN:
+        return jsonify({'error': f'Trop de ports demandés. Limitez à {MAX_PORTS_PER_SCAN} ports maximum.'}), 400
+    
+    # Construction de la liste des hôtes (sans doublons, dans l'ordre)
+    hosts = []
+    try:
+        for ip in ips:
+            hosts.append(str(ipaddress.ip_address(ip)))
+        if cidr:
+            network = ipaddress.ip_network(cidr, strict=False)
+            # Vérifier le budget avant de générer les adresses
+            if network.num_addresses * len(ports) > budget:
+                return jsonify({'error': f'Trop de sondes demandées. Limitez à {budget} couples hôte×port.'}), 400
+            hosts.extend(str(host) for host in network.hosts())
+    except ValueError:
+        return jsonify({'error': 'Adresse IP ou CIDR invalide'}), 400
+    hosts = list(dict.fromkeys(hosts))
+    
+    # Budget de sondes par requête
+    total_probes = len(hosts) * len(ports)
+    if total_probes > budget:
+        return jsonify({'error': f'Trop de sondes demandées. Limitez à {budget} couples hôte×port.'}), 400
+    
+    options, error = _scan_options(data)
+    if error:
+        return error
+    
+    # Le moteur sert les hôtes à tour de rôle, aucune cible n'est saturée
+    results = {host: {} for host in hosts}
+    targets = ((host, port) for host in hosts for port in ports)
+    for host, port, is_open in iter_connect_scan(targets, **options):
+        results[host][port] = is_open
+    
+    grouped = []
+    for host in hosts:
+        grouped.append({
+            'ip': host,
+            'open_ports': [port for port in ports if results[host][port]],
+            'closed_ports': [port for port in ports if not results[host][port]]
+        })
+    
+    hosts_up = sum(1 for entry in grouped if entry['open_ports'])
+    
+    # Log des résultats
+    log_activity('port_scanner', 'batch_scan', 
+                 f"Cibles: {len(hosts)}, Ports par cible: {len(ports)}", 
+                 f"Hôtes avec ports ouverts: {hosts_up}")
+    
+    return jsonify({
+        'total_hosts': len(hosts),
+        'total_probes': total_probes,
+        'hosts_with_open_ports': hosts_up,
+        'hosts': grouped
+    })
+
+def _iter_nmap_xml(stream):
+    """Analyse au fil de l'eau la sortie XML de nmap (-oX -) et génère des
+    enregistrements 'progress', 'port', 'host' et 'finished'.
+
+    Les éléments sont libérés dès qu'ils sont traités : la mémoire reste
+    constante quelle que soit la taille de la plage scannée.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    current_ip = None
+    
+    while True:
+        # read1() renvoie les octets disponibles sans attendre un bloc complet
+        chunk = stream.read1(65536)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = elem
+                elif elem.tag == 'host':
+                    current_ip = None
+                continue
+            
+            if elem.tag == 'taskprogress':
+                yield {
+                    'type': 'progress',
+                    'task': elem.get('task'),
+                    'percent': float(elem.get('percent', 0)),
+                    'remaining': int(elem.get('remaining', 0)),
+                    'etc': elem.get('etc')
+                }
+            elif elem.tag == 'address' and elem.get('addrtype') in ('ipv4', 'ipv6'):
+                current_ip = elem.get('addr')
+            elif elem.tag == 'port':
+                state = elem.find('state')
+                service = elem.find('service')
+                yield {
+                    'type': 'port',
+                    'ip': current_ip,
+                    'port': int(elem.get('portid')),
+                    'protocol': elem.get('protocol'),
+                    'state': state.get('state') if state is not None else 'unknown',
+                    'reason': state.get('reason') if state is not None else None,
+                    'service': service.get('name', 'unknown') if service is not None else 'unknown',
+                    'product': service.get('product') if service is not None else None,
+                    'version': service.get('version') if service is not None else None
+                }
+                elem.clear()
+            elif elem.tag == 'host':
+                status = elem.find('status')
+                yield {
+                    'type': 'host',
+                    'ip': current_ip,
+                    'status': status.get('state') if status is not None else 'unknown',
+                    'reason': status.get('reason') if status is not None else None,
+                    'hostnames': [hostname.get('name') for hostname in elem.iter('hostname')]
+                }
+                # Détacher l'hôte traité de la racine du document
+                root.clear()
+            elif elem.tag == 'finished':
+                yield {
+                    'type': 'finished',
+                    'elapsed': float(elem.get('elapsed', 0)),
+                    'summary': elem.get('summary'),
+                    'exit': elem.get('exit')
+                }
+    parser.close()
+
+def iter_nmap_scan(ip, port_range, stats_interval='2s'):
+    """Exécute nmap en sortie XML et génère ses enregistrements au fur et à mesure"""
+    # Note: Cela nécessite que nmap soit installé sur le serveur
+    command = ['nmap', '-oX', '-', '--stats-every', stats_interval, '-p', port_range, ip]
+    # stderr est redirigé vers un fichier temporaire : un tube non lu pendant
+    # l'analyse du XML pourrait se remplir et bloquer nmap
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        yield from _iter_nmap_xml(process.stdout)
+        if process.wait() != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors='replace').strip()
+            raise RuntimeError(message or f'nmap a échoué (code {process.returncode})')
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
+
+def _parse_nmap_scan(data):
+    """Valide une requête de scan nmap et renvoie (ip, plage de ports, erreur)"""
     ip = data.get('ip')
     port_range = data.get('port_range', '1-1000')  # Format: "1-1000"
     
@@ -82,35 +448,41 @@ def scan_with_nmap():
     try:
         ipaddress.ip_address(ip)
     except ValueError:
-        return jsonify({'error': 'Adresse IP invalide'}), 400
+        return None, None, (jsonify({'error': 'Adresse IP invalide'}), 400)
     
     # Limiter la plage de ports pour éviter les abus
     if '-' in port_range:
-        start, end = map(int, port_range.split('-'))
+        try:
+            start, end = map(int, port_range.split('-'))
+        except ValueError:
+            return None, None, (jsonify({'error': 'Plage de ports invalide'}), 400)
         if end - start > 1000:
-            return jsonify({'error': 'Plage de ports trop large. Limitez à 1000 ports maximum.'}), 400
+            return None, None, (jsonify({'error': 'Plage de ports trop large. Limitez à 1000 ports maximum.'}), 400)
+    
+    return ip, port_range, None
+
+@port_blueprint.route('/scan-nmap', methods=['POST'])
+def scan_with_nmap():
+    """Effectue un scan de ports en utilisant nmap (nécessite nmap installé sur le serveur)"""
+    ip, port_range, error = _parse_nmap_scan(request.json)
+    if error:
+        return error
     
     try:
-        # Exécuter nmap avec paramètres de base
-        # Note: Cela nécessite que nmap soit installé sur le serveur
-        command = ['nmap', '-p', port_range, ip]
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        
-        if stderr:
-            return jsonify({'error': stderr.decode()}), 500
-        
-        # Analyse de la sortie nmap
-        output = stdout.decode()
-        
-        # Extraction des ports ouverts (analyse simple)
+        # Seuls les ports ouverts sont conservés, la sortie XML est analysée au fil de l'eau
         open_ports = []
-        for line in output.splitlines():
-            if 'open' in line and '/tcp' in line:
-                parts = line.split()
-                port = parts[0].split('/')[0]
-                service = parts[-1] if len(parts) > 2 else "unknown"
-                open_ports.append({'port': port, 'service': service})
+        host_status = None
+        for record in iter_nmap_scan(ip, port_range):
+            if record['type'] == 'port' and record['state'] == 'open':
+                open_ports.append({
+                    'port': record['port'],
+                    'protocol': record['protocol'],
+                    'state': record['state'],
+                    'reason': record['reason'],
+                    'service': record['service']
+                })
+            elif record['type'] == 'host':
+                host_status = record['status']
         
         # Log des résultats
         log_activity('port_scanner', 'nmap_scan', 
@@ -120,8 +492,36 @@ def scan_with_nmap():
         return jsonify({
             'ip': ip,
             'port_range': port_range,
-            'open_ports': open_ports,
-            'raw_output': output
+            'host_status': host_status,
+            'open_ports': open_ports
         })
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de l\'exécution de nmap: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erreur lors de l\'exécution de nmap: {str(e)}'}), 500
+
+@port_blueprint.route('/scan-nmap/stream', methods=['POST'])
+def stream_scan_with_nmap():
+    """Scan nmap en flux : progression, ports et hôtes sont émis dès que nmap les produit"""
+    ip, port_range, error = _parse_nmap_scan(request.json)
+    if error:
+        return error
+    
+    fmt = request.json.get('format', 'ndjson')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Valeurs acceptées: {", ".join(STREAM_FORMATS)}'}), 400
+    
+    def generate():
+        open_count = 0
+        try:
+            for record in iter_nmap_scan(ip, port_range):
+                if record['type'] == 'port' and record['state'] == 'open':
+                    open_count += 1
+                yield record
+        except Exception as e:
+            yield {'type': 'error', 'error': f'Erreur lors de l\'exécution de nmap: {str(e)}'}
+            return
+        
+        log_activity('port_scanner', 'nmap_scan_stream', 
+                    f"IP: {ip}, Plage de ports: {port_range}", 
+                    f"Ports ouverts trouvés: {open_count}")
+    
+    return stream_response(generate(), fmt)
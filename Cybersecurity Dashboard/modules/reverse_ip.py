@@ -1,46 +1,167 @@
 # modules/reverse_ip.py - Module de reverse IP en mode privé
 
 from flask import Blueprint, request, jsonify, current_app
-import requests
-from database import log_activity
+from http_client import http_client
+from singleflight import inflight
+import ipaddress
+import time
+from database import get_db_connection, log_activity
 
 reverse_ip_blueprint = Blueprint('reverse_ip', __name__)
 
+# Pagination des listes de domaines
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Durée de conservation par défaut d'une liste de domaines (en secondes)
+DEFAULT_REVERSE_IP_TTL = 24 * 3600
+
 @reverse_ip_blueprint.route('/lookup', methods=['POST'])
 def reverse_ip_lookup():
-    """Recherche les domaines hébergés sur une adresse IP"""
+    """Recherche les domaines hébergés sur une adresse IP.
+
+    La liste est obtenue une fois par IP et conservée (REVERSE_IP_TTL), puis
+    servie par pages : 'cursor' (renvoyé en 'next_cursor' par la page
+    précédente), 'limit', et filtres optionnels 'contains' (sous-chaîne) et
+    'tld' (ex: 'fr').
+    """
     ip = request.json.get('ip')
+    cursor = request.json.get('cursor')
+    contains = request.json.get('contains') or ''
+    tld = request.json.get('tld') or ''
     
-    if not ip:
+    if not ip or not isinstance(ip, str):
         return jsonify({'error': 'Adresse IP non spécifiée'}), 400
+    if not all(isinstance(value, str) for value in (contains, tld)) or not isinstance(cursor, (str, type(None))):
+        return jsonify({'error': 'Curseur ou filtres invalides (texte attendu)'}), 400
+    contains = contains.strip().lower()
+    tld = tld.strip().lower().lstrip('.')
+    
+    try:
+        limit = int(request.json.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Taille de page invalide'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'Taille de page invalide. Valeurs acceptées: 1 à {MAX_PAGE_SIZE}'}), 400
+    
+    ip = _normalize_ip(ip)
+    ttl = current_app.config.get('REVERSE_IP_TTL', DEFAULT_REVERSE_IP_TTL)
+    
+    # Les demandes identiques simultanées partagent une seule recherche (et ses logs)
+    (lookup, status), shared = inflight.do(('hackertarget', ip), lambda: _load_domains(ip, ttl))
+    if status != 200:
+        return jsonify(lookup), status
+    
+    # Première page servie depuis la liste conservée : une entrée de log par demande
+    if cursor is None and not lookup['fetched'] and not shared:
+        log_activity('reverse_ip', 'lookup', ip, f"{lookup['domains_count']} domaines (cache)")
+    
+    domains, next_cursor, matched = _domain_page(ip, cursor, limit, contains, tld)
+    page = {
+        'ip': ip,
+        'domains_count': lookup['domains_count'],
+        'domains': domains,
+        'next_cursor': next_cursor,
+        'fetched_at': lookup['fetched_at']
+    }
+    if contains or tld:
+        page['matched_count'] = matched
+    return jsonify(page)
+
+def _normalize_ip(ip):
+    """Forme canonique d'une adresse IP (ou du texte tel quel si ce n'en est pas une)"""
+    try:
+        return str(ipaddress.ip_address(ip.strip()))
+    except ValueError:
+        return ip.strip().lower()
+
+def _load_domains(ip, ttl):
+    """S'assure que la liste des domaines de ip est conservée et à jour (sinon
+    l'obtient de HackerTarget) ; renvoie (infos de la liste, code HTTP)"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT domains_count, fetched_at FROM reverse_ip_lookups WHERE ip = ?',
+                       (ip,)).fetchone()
+    conn.close()
+    if row is not None and time.time() - row['fetched_at'] < ttl:
+        return {'domains_count': row['domains_count'], 'fetched_at': row['fetched_at'], 'fetched': False}, 200
     
     # Log de l'activité
     log_activity('reverse_ip', 'lookup', ip)
     
     # Utiliser le service HackerTarget pour le reverse IP
     try:
-        response = requests.get(f"https://api.hackertarget.com/reverseiplookup/?q={ip}")
+        response = http_client.get('hackertarget', f"https://api.hackertarget.com/reverseiplookup/?q={ip}")
         
         if response.status_code == 200:
             # Le service renvoie une liste de domaines séparés par des sauts de ligne
             domains = response.text.strip().split('\n')
             
-            # Filtrer les erreurs potentielles
-            if len(domains) == 1 and ('error' in domains[0].lower() or 'invalid' in domains[0].lower()):
-                return jsonify({'error': domains[0]}), 400
+            # Filtrer les erreurs potentielles (dont le quota dépassé, à ne pas conserver)
+            message = domains[0].lower()
+            if len(domains) == 1 and ('error' in message or 'invalid' in message or 'api count' in message):
+                return {'error': domains[0]}, 400
+            
+            domains_count, fetched_at = _store_domains(ip, domains)
                 
             # Log des résultats
-            log_activity('reverse_ip', 'lookup_result', ip, f"{len(domains)} domaines trouvés")
+            log_activity('reverse_ip', 'lookup_result', ip, f"{domains_count} domaines trouvés")
             
-            return jsonify({
-                'ip': ip,
-                'domains_count': len(domains),
-                'domains': domains
-            })
+            return {'domains_count': domains_count, 'fetched_at': fetched_at, 'fetched': True}, 200
         else:
-            return jsonify({'error': f'Erreur de service: {response.text}'}), response.status_code
+            return {'error': f'Erreur de service: {response.text}'}, response.status_code
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de la recherche reverse IP: {str(e)}'}), 500
+        return {'error': f'Erreur lors de la recherche reverse IP: {str(e)}'}, 500
+
+def _store_domains(ip, domains):
+    """Remplace la liste conservée des domaines de ip (une seule transaction) ;
+    renvoie (nombre de domaines, date de récupération)"""
+    domains = {domain.strip().lower().rstrip('.') for domain in domains if domain.strip()}
+    fetched_at = time.time()
+    
+    conn = get_db_connection()
+    with conn:
+        conn.execute('DELETE FROM reverse_ip_domains WHERE ip = ?', (ip,))
+        conn.executemany(
+            'INSERT INTO reverse_ip_domains (ip, domain, tld) VALUES (?, ?, ?)',
+            ((ip, domain, domain.rsplit('.', 1)[-1]) for domain in domains)
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO reverse_ip_lookups (ip, domains_count, fetched_at) VALUES (?, ?, ?)',
+            (ip, len(domains), fetched_at)
+        )
+    conn.close()
+    return len(domains), fetched_at
+
+def _domain_page(ip, cursor, limit, contains='', tld=''):
+    """Page de domaines triés après cursor (pagination par clé), avec filtres.
+    Renvoie (domaines, curseur suivant ou None, nombre de domaines filtrés)"""
+    conditions = ['ip = ?']
+    params = [ip]
+    if contains:
+        escaped = contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("domain LIKE ? ESCAPE '\\'")
+        params.append(f'%{escaped}%')
+    if tld:
+        conditions.append('tld = ?')
+        params.append(tld)
+    where = ' AND '.join(conditions)
+    
+    conn = get_db_connection()
+    matched = None
+    if contains or tld:
+        matched = conn.execute(f'SELECT COUNT(*) FROM reverse_ip_domains WHERE {where}', params).fetchone()[0]
+    if cursor:
+        where += ' AND domain > ?'
+        params.append(cursor)
+    rows = conn.execute(
+        f'SELECT domain FROM reverse_ip_domains WHERE {where} ORDER BY domain LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+    conn.close()
+    
+    domains = [row['domain'] for row in rows[:limit]]
+    next_cursor = domains[-1] if len(rows) > limit else None
+    return domains, next_cursor, matched
 
 @reverse_ip_blueprint.route('/whois-domain', methods=['POST'])
 def domain_whois():
@@ -55,7 +176,7 @@ def domain_whois():
     
     # Utiliser le service HackerTarget pour le WHOIS
     try:
-        response = requests.get(f"https://api.hackertarget.com/whois/?q={domain}")
+        response = http_client.get('hackertarget', f"https://api.hackertarget.com/whois/?q={domain}")
         
         if response.status_code == 200:
             whois_data = response.text
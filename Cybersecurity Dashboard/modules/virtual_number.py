@@ -14,82 +14,100 @@ virtual_number_blueprint = Blueprint('virtual_number', __name__)
 virtual_sms_queue = {}
 sms_simulation_running = False
 
-def simulate_incoming_sms():
-    """Simule l'arrivée de SMS pour les numéros virtuels"""
+# Cadence par défaut de la simulation : intervalle entre deux passes (en
+# secondes) et SMS reçus par numéro et par minute
+DEFAULT_SMS_TICK = 30
+DEFAULT_SMS_RATE = 0.2
+
+# Types de SMS simulés : (expéditeur, modèle du message, est un OTP). Le code
+# des OTP est tiré au hasard et inséré dans le modèle ({code})
+SMS_TEMPLATES = (
+    ('Facebook', 'Your Facebook verification code is: {code}', True),
+    ('Google', 'Your Google verification code is: {code}', True),
+    ('Twitter', 'Your Twitter verification code is: {code}', True),
+    ('Amazon', 'Your Amazon OTP: {code}', True),
+    ('Bank', 'Your transaction code: {code}', True),
+    ('+15551234567', 'Hello! How are you?', False),
+    ('Marketing', 'Check out our new offers!', False),
+)
+
+def _generate_sms(numbers, probability):
+    """SMS simulés d'une passe : (numéro, expéditeur, message, OTP, code)"""
+    messages = []
+    for number in numbers:
+        # Simuler aléatoirement l'arrivée d'un SMS
+        if random.random() < probability:
+            sender, template, is_otp = random.choice(SMS_TEMPLATES)
+            otp_code = str(random.randint(100000, 999999)) if is_otp else None
+            message = template.format(code=otp_code) if is_otp else template
+            messages.append((number, sender, message, is_otp, otp_code))
+    return messages
+
+def simulate_sms_tick(probability):
+    """Une passe de simulation : les SMS de tous les numéros sont générés
+    d'abord, puis écrits en une seule transaction (un executemany par table).
+    Renvoie le nombre de SMS simulés"""
+    conn = get_db_connection()
+    
+    # Récupérer tous les numéros virtuels actifs
+    numbers = conn.execute('SELECT id, phone_number FROM virtual_numbers').fetchall()
+    messages = _generate_sms(numbers, probability)
+    if not messages:
+        conn.close()
+        return 0
+    
+    with conn:
+        # Ajouter les SMS à la base de données ; dans la transaction, leurs
+        # identifiants sont consécutifs et se terminent par last_insert_rowid()
+        conn.executemany(
+            'INSERT INTO received_sms (virtual_number_id, sender, message, is_otp, otp_code) VALUES (?, ?, ?, ?, ?)',
+            [(number['id'], sender, message, 1 if is_otp else 0, otp_code)
+             for number, sender, message, is_otp, otp_code in messages]
+        )
+        first_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0] - len(messages) + 1
+        
+        # Mettre à jour la date de dernière utilisation des numéros
+        conn.executemany(
+            'UPDATE virtual_numbers SET last_used = CURRENT_TIMESTAMP WHERE id = ?',
+            [(number_id,) for number_id in {message[0]['id'] for message in messages}]
+        )
+        
+        # Log de l'activité
+        conn.executemany(
+            'INSERT INTO activity_logs (module, action, input_data, result_summary) VALUES (?, ?, ?, ?)',
+            [('virtual_number', 'sms_received', f"Numéro: {number['phone_number']}",
+              f"Expéditeur: {sender}, OTP: {'Oui' if is_otp else 'Non'}")
+             for number, sender, message, is_otp, otp_code in messages]
+        )
+    conn.close()
+    
+    # Ajouter à la file d'attente pour l'API SSE
+    received_at = datetime.now().isoformat()
+    for offset, (number, sender, message, is_otp, otp_code) in enumerate(messages):
+        virtual_sms_queue.setdefault(number['phone_number'], []).append({
+            'id': first_id + offset,
+            'sender': sender,
+            'message': message,
+            'is_otp': is_otp,
+            'otp_code': otp_code,
+            'received_at': received_at
+        })
+    return len(messages)
+
+def simulate_incoming_sms(tick=DEFAULT_SMS_TICK, rate=DEFAULT_SMS_RATE):
+    """Simule l'arrivée de SMS pour les numéros virtuels, une passe toutes les
+    tick secondes, à raison de rate SMS par numéro et par minute"""
     global sms_simulation_running
     
     sms_simulation_running = True
+    probability = min(1.0, rate * tick / 60)
     
     while sms_simulation_running:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Récupérer tous les numéros virtuels actifs
-        cursor.execute('SELECT id, phone_number FROM virtual_numbers')
-        numbers = cursor.fetchall()
-        
-        for number in numbers:
-            # Simuler aléatoirement l'arrivée d'un SMS (10% de chance)
-            if random.random() < 0.1:
-                # Types de SMS simulés
-                sms_types = [
-                    {'sender': 'Facebook', 'message': f'Your Facebook verification code is: {random.randint(100000, 999999)}', 'is_otp': True},
-                    {'sender': 'Google', 'message': f'Your Google verification code is: {random.randint(100000, 999999)}', 'is_otp': True},
-                    {'sender': 'Twitter', 'message': f'Your Twitter verification code is: {random.randint(100000, 999999)}', 'is_otp': True},
-                    {'sender': 'Amazon', 'message': f'Your Amazon OTP: {random.randint(100000, 999999)}', 'is_otp': True},
-                    {'sender': 'Bank', 'message': f'Your transaction code: {random.randint(100000, 999999)}', 'is_otp': True},
-                    {'sender': '+15551234567', 'message': 'Hello! How are you?', 'is_otp': False},
-                    {'sender': 'Marketing', 'message': 'Check out our new offers!', 'is_otp': False}
-                ]
-                
-                # Sélectionner aléatoirement un type de SMS
-                sms = random.choice(sms_types)
-                
-                # Extraire le code OTP si c'est un SMS d'OTP
-                otp_code = None
-                if sms['is_otp']:
-                    import re
-                    match = re.search(r'\d{6}', sms['message'])
-                    if match:
-                        otp_code = match.group(0)
-                
-                # Ajouter le SMS à la base de données
-                cursor.execute(
-                    'INSERT INTO received_sms (virtual_number_id, sender, message, is_otp, otp_code) VALUES (?, ?, ?, ?, ?)',
-                    (number['id'], sms['sender'], sms['message'], 1 if sms['is_otp'] else 0, otp_code)
-                )
-                
-                # Mettre à jour la date de dernière utilisation du numéro
-                cursor.execute(
-                    'UPDATE virtual_numbers SET last_used = CURRENT_TIMESTAMP WHERE id = ?',
-                    (number['id'],)
-                )
-                
-                conn.commit()
-                
-                # Ajouter à la file d'attente pour l'API SSE
-                phone_number = number['phone_number']
-                if phone_number not in virtual_sms_queue:
-                    virtual_sms_queue[phone_number] = []
-                    
-                virtual_sms_queue[phone_number].append({
-                    'id': cursor.lastrowid,
-                    'sender': sms['sender'],
-                    'message': sms['message'],
-                    'is_otp': sms['is_otp'],
-                    'otp_code': otp_code,
-                    'received_at': datetime.now().isoformat()
-                })
-                
-                # Log de l'activité
-                log_activity('virtual_number', 'sms_received', 
-                            f"Numéro: {phone_number}", 
-                            f"Expéditeur: {sms['sender']}, OTP: {'Oui' if sms['is_otp'] else 'Non'}")
-        
-        conn.close()
+        started = time.monotonic()
+        simulate_sms_tick(probability)
         
-        # Attendre 30 secondes avant la prochaine simulation
-        time.sleep(30)
+        # Attendre la prochaine passe (la durée de la passe est décomptée)
+        time.sleep(max(0, tick - (time.monotonic() - started)))
 
 @virtual_number_blueprint.route('/create', methods=['POST'])
 def create_virtual_number():
@@ -118,7 +136,12 @@ def create_virtual_number():
     # Démarrer la simulation de SMS si ce n'est pas déjà fait
     global sms_simulation_running
     if not sms_simulation_running:
-        simulation_thread = threading.Thread(target=simulate_incoming_sms)
+        sms_simulation_running = True
+        simulation_thread = threading.Thread(
+            target=simulate_incoming_sms,
+            args=(current_app.config.get('SMS_SIMULATION_TICK', DEFAULT_SMS_TICK),
+                  current_app.config.get('SMS_SIMULATION_RATE', DEFAULT_SMS_RATE))
+        )
         simulation_thread.daemon = True
         simulation_thread.start()
     
@@ -0,0 +1,163 @@
+# rate_limiter.py - Limitation de débit par fournisseur externe (seaux à jetons et file d'attente)
+
+import math
+import threading
+import time
+from collections import deque
+
+# Débits par défaut : (requêtes par seconde, rafale), d'après les quotas gratuits
+PROVIDER_RATES = {
+    'haveibeenpwned': (10 / 60, 1),
+    'github': (0.5, 10),
+    'shodan': (1, 1),
+    'hackertarget': (1, 2),
+    'ipinfo': (10, 20),
+    'ip-api': (45 / 60, 45),
+    'reddit': (1, 5),
+    'gravatar': (5, 10),
+}
+
+# Attente maximale dans la file d'un fournisseur (en secondes)
+DEFAULT_QUEUE_TIMEOUT = 30
+
+class RateLimitTimeout(Exception):
+    """Aucun créneau obtenu dans le délai imparti"""
+
+class _Bucket:
+    """Seau à jetons d'un fournisseur, avec sa file d'attente (FIFO)"""
+    
+    def __init__(self, lock, rate=None, burst=1):
+        self.rate = rate        # None : pas de limite de débit
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.queue = deque()
+        self.condition = threading.Condition(lock)
+        self.granted = 0
+        self.waited = 0.0
+    
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class RateLimiter:
+    """Planificateur des appels sortants : chaque fournisseur a un seau à jetons
+    (débit et rafale), les appelants attendent leur tour dans l'ordre d'arrivée,
+    et un Retry-After suspend tous les appels vers le fournisseur.
+    """
+    
+    def __init__(self, rates=PROVIDER_RATES):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for provider, (rate, burst) in rates.items():
+            self.configure(provider, rate, burst)
+    
+    def configure(self, provider, rate, burst=1, override=True):
+        """Définit le débit (requêtes par seconde) et la rafale d'un fournisseur ;
+        avec override=False, un débit déjà défini est conservé.
+        ValueError si le débit n'est pas strictement positif ou si la rafale
+        est inférieure à 1"""
+        if rate is not None and not (math.isfinite(rate) and rate > 0):
+            raise ValueError(f'Débit invalide pour {provider}: {rate} (requêtes par seconde, > 0)')
+        if not (math.isfinite(burst) and burst >= 1):
+            raise ValueError(f'Rafale invalide pour {provider}: {burst} (>= 1)')
+        with self._lock:
+            bucket = self._buckets.get(provider)
+            if bucket is None:
+                self._buckets[provider] = _Bucket(self._lock, rate, burst)
+            elif override or bucket.rate is None:
+                bucket.rate, bucket.burst = rate, burst
+                bucket.tokens = min(bucket.tokens, burst)
+                bucket.condition.notify_all()
+    
+    def configure_from_string(self, value):
+        """Débits au format "fournisseur=débit/rafale,..." (ex: "shodan=1/1,github=0.5/10").
+        Toutes les entrées sont validées avant d'être appliquées : ValueError
+        (avec l'entrée fautive) si l'une d'elles est invalide"""
+        limits = []
+        for item in filter(None, (part.strip() for part in value.split(','))):
+            provider, _, rate_burst = item.partition('=')
+            rate, _, burst = rate_burst.partition('/')
+            try:
+                rate, burst = float(rate), float(burst or 1)
+            except ValueError:
+                rate = burst = None
+            if not provider.strip() or rate is None or not (math.isfinite(rate) and rate > 0) \
+                    or not (math.isfinite(burst) and burst >= 1):
+                raise ValueError(f'Limite de débit invalide "{item}" : format attendu '
+                                 'fournisseur=débit/rafale, avec débit > 0 et rafale >= 1')
+            limits.append((provider.strip(), rate, burst))
+        
+        for provider, rate, burst in limits:
+            self.configure(provider, rate, burst)
+    
+    def acquire(self, provider, timeout=DEFAULT_QUEUE_TIMEOUT):
+        """Attend un créneau pour appeler provider (RateLimitTimeout au-delà de timeout)"""
+        with self._lock:
+            bucket = self._buckets.get(provider)
+            if bucket is None:
+                return
+            
+            started = time.monotonic()
+            ticket = object()
+            bucket.queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+                    first = bucket.queue[0] is ticket
+                    if first and now >= bucket.blocked_until and (bucket.rate is None or bucket.tokens >= 1):
+                        if bucket.rate is not None:
+                            bucket.tokens -= 1
+                        bucket.granted += 1
+                        bucket.waited += now - started
+                        return
+                    
+                    remaining = started + timeout - now
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f'Limite de débit {provider}: aucun créneau sous {timeout} s')
+                    
+                    # En tête de file : attendre le prochain jeton (ou la fin de
+                    # la suspension) ; sinon, attendre que la tête soit servie
+                    wait = remaining
+                    if first:
+                        wait = max(bucket.blocked_until - now, 0)
+                        if bucket.rate is not None and bucket.tokens < 1:
+                            wait = max(wait, (1 - bucket.tokens) / bucket.rate)
+                        wait = min(wait, remaining)
+                    bucket.condition.wait(wait)
+            finally:
+                bucket.queue.remove(ticket)
+                bucket.condition.notify_all()
+    
+    def block(self, provider, delay):
+        """Suspend les appels vers provider pendant delay secondes (Retry-After)"""
+        with self._lock:
+            bucket = self._buckets.get(provider)
+            if bucket is None:
+                bucket = self._buckets[provider] = _Bucket(self._lock)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+            bucket.condition.notify_all()
+    
+    def stats(self):
+        """Profondeur de file, jetons disponibles et suspension par fournisseur"""
+        result = {}
+        with self._lock:
+            now = time.monotonic()
+            for provider, bucket in self._buckets.items():
+                bucket.refill(now)
+                result[provider] = {
+                    'rate': bucket.rate,
+                    'burst': bucket.burst,
+                    'tokens': None if bucket.rate is None else round(bucket.tokens, 2),
+                    'queue_depth': len(bucket.queue),
+                    'blocked_for': round(max(0, bucket.blocked_until - now), 2),
+                    'granted': bucket.granted,
+                    'avg_wait_ms': round(bucket.waited / bucket.granted * 1000, 1) if bucket.granted else 0.0
+                }
+        return result
+
+# Instance partagée par tout le processus
+rate_limiter = RateLimiter()
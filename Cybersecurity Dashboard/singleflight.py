@@ -0,0 +1,64 @@
+# singleflight.py - Regroupement des appels identiques simultanés vers les services externes
+
+import threading
+
+class _Call:
+    """Appel en cours, partagé par les appelants concurrents"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """Un seul appel en cours par clé : les appelants qui demandent la même clé
+    pendant l'appel attendent son résultat (ou son exception) au lieu de
+    relancer la requête.
+
+    Les clés sont de la forme (fournisseur, argument normalisé).
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0}
+    
+    def do(self, key, fn):
+        """Exécute fn() pour key, ou attend l'appel déjà en cours.
+        Renvoie (valeur, partagé) ; partagé vaut True si la valeur vient de
+        l'appel d'un autre thread"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['calls'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error.with_traceback(None)
+            return call.value, True
+        
+        try:
+            call.value = fn()
+            return call.value, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def stats(self):
+        """Compteurs d'appels et d'appels regroupés"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+# Instance partagée par tout le processus
+inflight = SingleFlight()
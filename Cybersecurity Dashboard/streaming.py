@@ -0,0 +1,40 @@
+# streaming.py - Réponses HTTP en flux (NDJSON ou Server-Sent Events)
+
+import json
+import asyncio
+from flask import Response, stream_with_context
+
+STREAM_FORMATS = ('ndjson', 'sse')
+
+def stream_response(records, fmt='ndjson'):
+    """Renvoie une réponse qui émet chaque enregistrement dès qu'il est produit"""
+    if fmt == 'sse':
+        # Le champ 'type' de l'enregistrement sert de nom d'événement SSE
+        body = (f"event: {record.get('type', 'message')}\ndata: {json.dumps(record)}\n\n"
+                for record in records)
+        mimetype = 'text/event-stream'
+    else:
+        body = (json.dumps(record) + '\n' for record in records)
+        mimetype = 'application/x-ndjson'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    # Éviter la mise en tampon par les proxys et navigateurs
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def iter_async(async_iterable):
+    """Parcourt un générateur asynchrone depuis du code synchrone, avec une boucle
+    d'événements dédiée (permet de servir un moteur asyncio dans une réponse en flux)"""
+    loop = asyncio.new_event_loop()
+    iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(iterator.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()